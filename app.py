@@ -1,63 +1,120 @@
+import os
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from src.pricing_engine import BlackScholes
+from src.pricing_engine import price_and_greeks_batch
 from src.risk_manager import RiskManager
 
+BACKTEST_PATH = "data/backtest_results.csv"
+MAX_CHART_POINTS = 5000  # Equity curves longer than this are decimated for plotting
+CONDOR_WIDTH = 200  # Points between the condor's short strikes, wings and ATM
+VOL_SHIFTS = np.round(np.arange(-0.05, 0.0501, 0.01), 2)  # Vol scenarios precomputed for the surface
+
 # Page Config
 st.set_page_config(page_title="Nifty Quant Trader", layout="wide")
 st.title("📊 Nifty Options Algo-Trader & Risk Engine")
 
+# --- CACHED BACKEND ---
+# Streamlit re-runs this script on every widget change; the expensive pieces
+# below are memoized on their actual inputs, so unrelated interactions are free.
+
+@st.cache_data
+def build_portfolio(spot_price, strategy_type):
+    """
+    Simulate 'Real' Portfolio: a hypothetical book for demonstration.
+    One row per option leg, so straddles and condors are not double counted.
+    """
+    atm = int(spot_price/50)*50
+    portfolio_trades = []
+
+    # Logic to build dummy portfolio based on selection
+    if strategy_type == "Long Call":
+        # Long ATM Call
+        portfolio_trades.append({'Strike': atm, 'Type': 'Call', 'Trade_Type': 'Long Call'})
+    elif strategy_type == "Short Straddle":
+        # Short ATM Call & Put
+        portfolio_trades.append({'Strike': atm, 'Type': 'Call', 'Trade_Type': 'Short Call'})
+        portfolio_trades.append({'Strike': atm, 'Type': 'Put', 'Trade_Type': 'Short Put'})
+    elif strategy_type == "Iron Condor":
+        # Short OTM strangle, protected by further OTM wings
+        portfolio_trades.append({'Strike': atm - CONDOR_WIDTH, 'Type': 'Put', 'Trade_Type': 'Short Put'})
+        portfolio_trades.append({'Strike': atm - 2 * CONDOR_WIDTH, 'Type': 'Put', 'Trade_Type': 'Long Put'})
+        portfolio_trades.append({'Strike': atm + CONDOR_WIDTH, 'Type': 'Call', 'Trade_Type': 'Short Call'})
+        portfolio_trades.append({'Strike': atm + 2 * CONDOR_WIDTH, 'Type': 'Call', 'Trade_Type': 'Long Call'})
+
+    return pd.DataFrame(portfolio_trades, columns=['Strike', 'Type', 'Trade_Type'])
+
+
+@st.cache_data
+def price_portfolio(spot_price, volatility, days_to_expiry, strategy_type):
+    """
+    Prices every leg (one vectorized call) and aggregates portfolio Greeks.
+    Each leg's entry price is its own current price.
+    """
+    portfolio = build_portfolio(spot_price, strategy_type)
+    greeks = price_and_greeks_batch(spot_price, portfolio['Strike'].to_numpy(dtype=float), days_to_expiry/365,
+                                    0.07, volatility, portfolio['Type'].to_numpy())
+    df_risk = pd.DataFrame({
+        'Strike': portfolio['Strike'],
+        'Type': portfolio['Type'],
+        'Trade_Type': portfolio['Trade_Type'],
+        'Expiry_Days': days_to_expiry,
+        'Price': greeks['Price'],
+        'Entry_Price': greeks['Price'],
+        'Delta': greeks['Delta'],
+        'Gamma': greeks['Gamma'],
+        'Vega': greeks['Vega'],
+        'Theta': greeks['Theta']
+    })
+    portfolio_risk = RiskManager(lot_size=25).calculate_portfolio_risk(df_risk)
+    return df_risk, portfolio_risk
+
+
+@st.cache_data
+def risk_surface(spot_price, volatility, days_to_expiry, strategy_type, points=41):
+    """
+    Full-revaluation P&L over spot (+/-10%) x days forward (today..expiry) x vol shift.
+    """
+    df_risk, _ = price_portfolio(spot_price, volatility, days_to_expiry, strategy_type)
+    return RiskManager(lot_size=25).pnl_surface(
+        df_risk, spot_price, volatility,
+        spot_moves=np.linspace(-0.10, 0.10, points),
+        days_forward=np.arange(days_to_expiry + 1),
+        vol_shifts=VOL_SHIFTS
+    )
+
+
+@st.cache_data
+def load_backtest(path, modified_time):
+    """
+    Loads the backtest CSV only when its modification time changes.
+    Long curves are decimated to MAX_CHART_POINTS for plotting.
+    """
+    backtest_df = pd.read_csv(path)
+    final_balance = backtest_df['Equity'].iloc[-1]
+    step = max(1, len(backtest_df) // MAX_CHART_POINTS)
+    plot_df = backtest_df.iloc[::step]
+    if step > 1 and plot_df.index[-1] != backtest_df.index[-1]:
+        plot_df = pd.concat([plot_df, backtest_df.iloc[[-1]]])
+    return plot_df, final_balance
+
+
 # --- SIDEBAR: MARKET SIMULATOR ---
 st.sidebar.header("Market Simulator")
 spot_price = st.sidebar.number_input("Nifty Spot Price", value=24825, step=50)
 volatility = st.sidebar.slider("Market Volatility (IV)", 0.05, 0.50, 0.11)
 days_to_expiry = st.sidebar.slider("Days to Expiry", 1, 30, 25)
 
-# --- BACKEND: GENERATE DATA ---
-# Generate a chain centered around the user's selected Spot Price
-strikes = range(int(spot_price/50)*50 - 1000, int(spot_price/50)*50 + 1000, 50)
-chain_data = []
-
-# Simulate 'Real' Portfolio: Let's assume we are Short Strangle (Selling OTM Calls/Puts)
-# We will hardcode a hypothetical portfolio for demonstration
 st.sidebar.subheader("Active Strategy")
 strategy_type = st.sidebar.selectbox("Select Strategy", ["Long Call", "Short Straddle", "Iron Condor"])
-
-portfolio_trades = []
-
-# Logic to build dummy portfolio based on selection
-if strategy_type == "Long Call":
-    # Long ATM Call
-    portfolio_trades.append({'Strike': int(spot_price/50)*50, 'Type': 'Call', 'Trade_Type': 'Long Call'})
-elif strategy_type == "Short Straddle":
-    # Short ATM Call & Put
-    atm = int(spot_price/50)*50
-    portfolio_trades.append({'Strike': atm, 'Type': 'Call', 'Trade_Type': 'Short Straddle'})
-    portfolio_trades.append({'Strike': atm, 'Type': 'Put', 'Trade_Type': 'Short Straddle'})
+vol_shift = st.sidebar.select_slider("Vol Shift (Scenario)", options=list(VOL_SHIFTS), value=0.0)
 
 # Calculate Metrics for the Portfolio
-risk_data = []
-for trade in portfolio_trades:
-    bs = BlackScholes(spot_price, trade['Strike'], days_to_expiry/365, 0.07, volatility, type=trade['Type'].lower())
-    price = bs.calculate_price()
-    
-    risk_data.append({
-        'Strike': trade['Strike'],
-        'Trade_Type': trade['Trade_Type'],
-        'Price': price,
-        'Delta': bs.calculate_delta(),
-        'Gamma': bs.calculate_gamma(),
-        'Vega': bs.calculate_vega(),
-        'Theta': bs.calculate_theta()
-    })
-
-df_risk = pd.DataFrame(risk_data)
+df_risk, portfolio_risk = price_portfolio(spot_price, volatility, days_to_expiry, strategy_type)
 
 # --- RUN RISK MANAGER ---
 rm = RiskManager(lot_size=25)
-portfolio_risk = rm.calculate_portfolio_risk(df_risk)
 
 # --- DASHBOARD LAYOUT ---
 col1, col2, col3 = st.columns(3)
@@ -76,35 +133,29 @@ with col3:
 
 # --- VISUALIZATION: PAYOFF DIAGRAM ---
 st.subheader("Simulated P&L Payoff")
-# Create a range of spot prices to simulate outcome
-sim_spots = np.linspace(spot_price * 0.9, spot_price * 1.1, 50)
-pnl_values = []
-
-for s in sim_spots:
-    pnl = 0
-    for trade in portfolio_trades:
-        # PnL = (New_Price - Entry_Price) * Direction
-        # This is a simplified expiration payoff
-        if trade['Type'] == 'Call':
-            value = max(0, s - trade['Strike'])
-        else:
-            value = max(0, trade['Strike'] - s)
-            
-        entry = risk_data[0]['Price'] # Approximate entry as current price for visual
-        direction = 1 if "Long" in trade['Trade_Type'] else -1
-        pnl += direction * (value - entry) * 25 # Lot size
-        
-    pnl_values.append(pnl)
+surface = risk_surface(spot_price, volatility, days_to_expiry, strategy_type)
+sim_spots = surface['Spot']
+v = int(np.abs(surface['Vol_Shift'] - vol_shift).argmin())
+pnl_grid = surface['PnL'][:, :, v]  # Spot x days forward at the selected vol shift
 
 fig = go.Figure()
-fig.add_trace(go.Scatter(x=sim_spots, y=pnl_values, mode='lines', name='P&L', fill='tozeroy'))
+for day, label in ((0, 'Today'), (days_to_expiry // 2, f'T+{days_to_expiry // 2}d'), (days_to_expiry, 'Expiry')):
+    fig.add_trace(go.Scatter(x=sim_spots, y=pnl_grid[:, day], mode='lines', name=label,
+                             fill='tozeroy' if day == days_to_expiry else None))
 fig.add_vline(x=spot_price, line_dash="dash", line_color="white", annotation_text="Current Spot")
 st.plotly_chart(fig, use_container_width=True)
 
+st.subheader("P&L Surface (Spot x Days Forward)")
+fig_surface = go.Figure(go.Heatmap(x=surface['Days'], y=sim_spots, z=pnl_grid,
+                                   colorscale='RdYlGn', zmid=0, colorbar=dict(title="P&L (₹)")))
+fig_surface.update_layout(xaxis_title="Days Forward", yaxis_title="Spot", template="plotly_dark", height=450)
+st.plotly_chart(fig_surface, use_container_width=True)
+
 # --- RISK REPORT ---
 st.subheader("Risk Officer Report")
 var = rm.calculate_var(portfolio_risk['Net_Delta'], spot_price, volatility)
-crash_test = rm.stress_test(portfolio_risk['Net_Delta'], portfolio_risk['Net_Gamma'], spot_price)
+crash_test = rm.stress_test(portfolio_risk['Net_Delta'], portfolio_risk['Net_Gamma'], spot_price,
+                            book=df_risk, volatility=volatility, vol_shift=vol_shift)
 
 r1, r2 = st.columns(2)
 r1.error(f"VaR (1-Day 95%): ₹{var:,.2f}")
@@ -115,11 +166,10 @@ st.markdown("---")
 st.subheader("📜 Historical Backtest Performance (6 Months)")
 
 try:
-    backtest_df = pd.read_csv("data/backtest_results.csv")
+    plot_df, final_balance = load_backtest(BACKTEST_PATH, os.path.getmtime(BACKTEST_PATH))
     
     # Calculate Metrics
     initial_balance = 1000000
-    final_balance = backtest_df['Equity'].iloc[-1]
     total_return = ((final_balance - initial_balance) / initial_balance) * 100
     
     # Metrics Row
@@ -127,11 +177,11 @@ try:
     m1.metric("Initial Capital", f"₹{initial_balance:,.0f}")
     m2.metric("Final Equity", f"₹{final_balance:,.2f}", delta=f"{total_return:.2f}%")
     
-    # Draw Equity Curve
+    # Draw Equity Curve (WebGL trace stays fast on long curves)
     fig_equity = go.Figure()
-    fig_equity.add_trace(go.Scatter(
-        x=backtest_df['Date'], 
-        y=backtest_df['Equity'],
+    fig_equity.add_trace(go.Scattergl(
+        x=plot_df['Date'], 
+        y=plot_df['Equity'],
         mode='lines',
         name='Portfolio Value',
         line=dict(color='#00CC96', width=2)
@@ -0,0 +1,253 @@
+"""
+Reproducible benchmark suite for the hot paths (no network, seeded data).
+
+    python -m benchmarks.run_benchmarks                  # run + compare with baseline
+    python -m benchmarks.run_benchmarks --save-baseline  # record a new baseline
+    python -m benchmarks.run_benchmarks --filter backtest --threshold 0.5
+
+Results (seconds per call, best of several repeats) are written as JSON.
+The run exits with status 1 if any benchmark is slower than the stored
+baseline by more than --threshold (fractional, default 0.25 = 25%).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.pricing_engine import (BlackScholes, price_scalar, price_and_greeks_scalar,
+                                price_and_greeks_batch, implied_volatility_batch)
+from src.strategies import VolatilityStrategy
+from src.risk_manager import RiskManager
+from src.backtester import Backtester
+from src.position_book import PositionBook
+from src.vol_surface import VolSurface
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, "results.json")
+SEED = 42
+SPOT = 24000.0
+RATE = 0.07
+
+
+# --- SEEDED SYNTHETIC DATA ---
+
+def make_price_data(n_bars, seed=SEED):
+    """
+    GBM closes with the same Returns/Volatility columns as DataLoader output.
+    """
+    rng = np.random.default_rng(seed)
+    close = SPOT * np.exp(np.cumsum(rng.normal(0, 0.012, n_bars + 21)))
+    data = pd.DataFrame({'Close': close}, index=pd.bdate_range('2015-01-01', periods=n_bars + 21))
+    data['Returns'] = data['Close'].pct_change()
+    data['Volatility'] = data['Returns'].rolling(window=21).std() * np.sqrt(252)
+    return data.dropna()
+
+
+def make_contracts(n, seed=SEED):
+    # Strikes spanning deep ITM to deep OTM (+/-25%), 2-120 day tenors, calls and puts
+    rng = np.random.default_rng(seed)
+    strikes = np.round(SPOT * rng.uniform(0.75, 1.25, n) / 50) * 50
+    expiries = rng.uniform(2, 120, n) / 365
+    sigmas = rng.uniform(0.08, 0.45, n)
+    types = np.where(rng.random(n) < 0.5, 'call', 'put')
+    return strikes, expiries, sigmas, types
+
+
+def make_chain(seed=SEED):
+    rng = np.random.default_rng(seed)
+    strikes = np.arange(SPOT - 1000, SPOT + 1050, 50)
+    iv = 0.13 + 2e-8 * (strikes - SPOT) ** 2 + rng.normal(0, 0.01, len(strikes))
+    return pd.DataFrame({'Strike': strikes, 'Implied_Vol': iv, 'Spot': SPOT, 'Real_Vol': 0.13})
+
+
+def make_snapshots(n_snapshots, seed=SEED):
+    frames = []
+    for i in range(n_snapshots):
+        chain = make_chain(seed + i)
+        chain['Date'] = i
+        frames.append(chain)
+    return pd.concat(frames, ignore_index=True)
+
+
+def make_book(n_legs, seed=SEED):
+    rng = np.random.default_rng(seed)
+    strikes, expiries, sigmas, types = make_contracts(n_legs, seed)
+    greeks = price_and_greeks_batch(SPOT, strikes, expiries, RATE, sigmas, types)
+    return pd.DataFrame({
+        'Strike': strikes,
+        'Expiry_Days': np.round(expiries * 365),
+        'Trade_Type': rng.choice(['Long Call', 'Short Call', 'Long Straddle', 'Short Straddle'], n_legs),
+        'Delta': greeks['Delta'], 'Gamma': greeks['Gamma'], 'Vega': greeks['Vega'], 'Theta': greeks['Theta']
+    })
+
+
+# --- BENCHMARK DEFINITIONS ---
+# Each entry: name -> zero-argument callable (setup happens outside the timed call)
+
+def build_benchmarks():
+    benches = {}
+
+    bs = BlackScholes(SPOT, 24100, 20/365, RATE, 0.15, 'call')
+    benches['pricing.scalar_scipy.price_greeks'] = lambda: (bs.calculate_price(), bs.calculate_delta(), bs.calculate_gamma(),
+                                                            bs.calculate_vega(), bs.calculate_theta())
+    benches['pricing.scalar_fast.price'] = lambda: price_scalar(SPOT, 24100, 20/365, RATE, 0.15, True)
+    benches['pricing.scalar_fast.price_greeks'] = lambda: price_and_greeks_scalar(SPOT, 24100, 20/365, RATE, 0.15, True)
+
+    for n in (41, 10000, 100000):
+        K, T, sigma, types = make_contracts(n)
+        benches[f'pricing.batch.{n}'] = lambda K=K, T=T, sigma=sigma, types=types: \
+            price_and_greeks_batch(SPOT, K, T, RATE, sigma, types)
+
+    for n in (41, 5000):
+        K, T, sigma, types = make_contracts(n)
+        prices = price_and_greeks_batch(SPOT, K, T, RATE, sigma, types)['Price']
+        benches[f'iv.batch.{n}'] = lambda K=K, T=T, types=types, prices=prices: \
+            implied_volatility_batch(prices, SPOT, K, T, RATE, types)
+    K, T, sigma, types = make_contracts(41)
+    prices = price_and_greeks_batch(SPOT, K, T, RATE, sigma, types)['Price']
+    benches['iv.scalar_loop.41'] = lambda: [BlackScholes(SPOT, k, t, RATE, 0.2, ty).calculate_implied_volatility(p)
+                                            for k, t, ty, p in zip(K, T, types, prices)]
+
+    strategy = VolatilityStrategy(volatility_threshold=0.015)
+    chain = make_chain()
+    benches['strategy.generate_signals.41'] = lambda: strategy.generate_signals(chain.copy(), SPOT)
+    snapshots = make_snapshots(1000)
+    benches['strategy.generate_signals_batch.1000x41'] = lambda: strategy.generate_signals_batch(snapshots)
+
+    rm = RiskManager(lot_size=25)
+    for n in (100, 10000):
+        book = make_book(n)
+        benches[f'risk.portfolio_risk.{n}'] = lambda book=book: rm.calculate_portfolio_risk(book)
+
+    surface = VolSurface()
+    strikes = np.arange(SPOT - 2000, SPOT + 2050, 50)
+    for days in (7, 14, 21, 28, 56, 91):
+        surface.update_slice(days / 365, strikes, 0.15 + 0.4 * ((strikes - SPOT) / SPOT) ** 2 + 0.001 * days)
+    K, T, _, _ = make_contracts(100000)
+    benches['vol_surface.query.100000'] = lambda: surface.vol(K, T)
+    benches['vol_surface.update_slice'] = lambda: (surface.update_slice(28 / 365, strikes, np.full(len(strikes), 0.16)),
+                                                   surface.vol(SPOT, 0.1))
+
+    # Per-bar mark of an open book: scalar path for a straddle, batched for a big book
+    for n_legs in (2, 100):
+        book = PositionBook()
+        K, T, _, types = make_contracts(n_legs)
+        book.add(types == 'call', 1, K, 20000 + T * 365, 25, 100.0, 20000.0)
+        benches[f'backtest.mark.{n_legs}_legs'] = lambda book=book: book.mark(SPOT, 0.15, 20001.0)
+
+    for n in (250, 1000):
+        data = make_price_data(n)
+        benches[f'backtest.loop.{n}'] = lambda data=data: Backtester().run_backtest(data)
+    for n in (250, 2500, 25000):
+        data = make_price_data(n)
+        benches[f'backtest.columnar.{n}'] = lambda data=data: Backtester().run_backtest(data, engine='columnar')
+    data = make_price_data(2500)
+    benches['backtest.columnar.stacked.2500'] = lambda: Backtester(max_positions=100).run_backtest(data, engine='columnar')
+
+    return benches
+
+
+# --- TIMING / REPORTING ---
+
+def time_call(fn, repeat=5, min_time=0.05):
+    """
+    Best-of-`repeat` seconds per call; each repeat runs enough calls to last
+    at least `min_time` so fast kernels are not dominated by timer noise.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        fn()
+        single = time.perf_counter() - start
+        number = max(1, int(min_time / single)) if single > 0 else 1000
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns rows (name, baseline, current, ratio, regressed) for shared benchmarks.
+    """
+    rows = []
+    for name, current in results.items():
+        if name in baseline:
+            ratio = current / baseline[name]
+            rows.append((name, baseline[name], current, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pricing/IV/strategy/risk/backtest hot paths")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="Where to write this run's JSON results")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument('--filter', default=None, help="Only run benchmarks whose name contains this text")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    benches = build_benchmarks()
+    if args.filter:
+        benches = {k: v for k, v in benches.items() if args.filter in k}
+
+    results = {}
+    for name, fn in benches.items():
+        results[name] = time_call(fn, repeat=args.repeat)
+        print(f"{name:<45} {results[name] * 1e6:>14.2f} us")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'seed': SEED
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --save-baseline to create one.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+
+    rows = compare(results, baseline, args.threshold)
+    print(f"\n--- COMPARISON vs BASELINE (threshold +{args.threshold:.0%}) ---")
+    for name, base, current, ratio, regressed in rows:
+        flag = "REGRESSION" if regressed else "ok"
+        print(f"{name:<45} {base * 1e6:>12.2f} -> {current * 1e6:>12.2f} us  x{ratio:5.2f}  {flag}")
+
+    regressions = [r for r in rows if r[4]]
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed beyond the threshold.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
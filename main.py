@@ -1,120 +1,366 @@
-import pandas as pd
-import numpy as np
-from src.pricing_engine import BlackScholes
-from src.data_loader import DataLoader
-from src.visualization import plot_dashboard
-from src.strategies import VolatilityStrategy # Upgraded
-from src.risk_manager import RiskManager      # Upgraded
-from src.backtester import Backtester
+import argparse
+import os
+import sys
+from src import instrumentation
+from src.instrumentation import stage
+
+# Heavy libraries (pandas/numpy/scipy, matplotlib/seaborn, yfinance) are
+# imported inside the steps that need them, so `--help` and single
+# subcommands start fast.
 
 RISK_FREE_RATE = 0.07
+CHAIN_CSV = "data/option_chain_output.csv"
+BACKTEST_CSV = "data/backtest_results.csv"
+INTRADAY_CSV = "data/intraday_results.csv"
+DASHBOARD_PNG = "data/dashboard.png"
+
+
+def _has_display():
+    # Windows/macOS always have a GUI session; elsewhere look for X11/Wayland
+    if sys.platform in ('win32', 'darwin'):
+        return True
+    return bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+
+
+# --- PIPELINE STEPS ---
+
+def fetch_market(period="6mo", offline=False):
+    """
+    Fetches the underlying (served from the bar cache when warm) and returns
+    (loader, nifty_data, current_spot, current_vol).
+    """
+    import pandas as pd
+    from src.data_loader import DataLoader
 
-def run_analysis():
-    loader = DataLoader()
-    
-    # 1. Fetch Market Data
-    nifty_data = loader.fetch_underlying_data(period="6mo")
+    loader = DataLoader(offline=offline)
+    with stage('run.fetch'):
+        nifty_data = loader.fetch_underlying_data(period=period)
     current_spot = nifty_data['Close'].iloc[-1]
     current_vol = nifty_data['Volatility'].iloc[-1]
-    
+
     if isinstance(current_spot, pd.Series): current_spot = current_spot.item()
     if isinstance(current_vol, pd.Series): current_vol = current_vol.item()
-        
+
     print(f"MARKET SNAPSHOT: Spot {current_spot:.0f} | Vol {current_vol:.2%}")
-    
-    # 2. Generate Chain & Simulate Noise
-    chain = loader.generate_dummy_option_chain(current_spot, None)
-    results = []
-    
+    return loader, nifty_data, current_spot, current_vol
+
+
+def build_chain(loader, current_spot, current_vol):
+    """
+    Simulated chain with noisy market prices, solved IVs and Greeks.
+    Returns (results_df, chain).
+    """
+    import numpy as np
+    import pandas as pd
+    from src.pricing_engine import price_and_greeks_batch, implied_volatility_batch
+
+    with stage('run.chain'):
+        chain = loader.generate_dummy_option_chain(current_spot, None)
+
     print("\nSimulating Market Prices (Adding Random Noise)...")
-    for index, row in chain.iterrows():
-        bs = BlackScholes(row['Spot'], row['Strike'], row['Expiry_Days']/365, RISK_FREE_RATE, current_vol, 'call')
-        theoretical_price = bs.calculate_price()
-        
-        # Random Noise (0.85 to 1.15)
-        noise = np.random.uniform(0.85, 1.15)
-        market_price = theoretical_price * noise
-        
-        implied_vol = bs.calculate_implied_volatility(market_price)
-
-        results.append({
-            'Spot': row['Spot'],
-            'Strike': row['Strike'],
-            'Market_Price': market_price,
-            'Delta': bs.calculate_delta(),
-            'Gamma': bs.calculate_gamma(),
-            'Vega': bs.calculate_vega(),
-            'Theta': bs.calculate_theta(),
-            'Real_Vol': current_vol,
-            'Implied_Vol': implied_vol
-        })
-        
-    results_df = pd.DataFrame(results)
-    
-    # 3. RUN STRATEGY (Polynomial Fit + Straddles)
-    strategy = VolatilityStrategy(volatility_threshold=0.015) 
-    analyzed_df = strategy.generate_signals(results_df, current_spot)
-    
+    spots = chain['Spot'].to_numpy(dtype=float)
+    strikes = chain['Strike'].to_numpy(dtype=float)
+    expiries = chain['Expiry_Days'].to_numpy(dtype=float) / 365
+
+    # Theoretical prices for the whole chain in one vectorized call
+    theoretical = price_and_greeks_batch(spots, strikes, expiries, RISK_FREE_RATE, current_vol, 'call')
+
+    # Random Noise (0.85 to 1.15)
+    noise = np.random.uniform(0.85, 1.15, size=len(chain))
+    market_prices = theoretical['Price'] * noise
+
+    # Solve IV for every quote at once (Newton with bisection fallback)
+    implied_vols, _ = implied_volatility_batch(market_prices, spots, strikes, expiries, RISK_FREE_RATE, 'call')
+
+    # Greeks at the solved IV (fall back to realized vol where IV could not be solved)
+    greek_vols = np.where(implied_vols > 0, implied_vols, current_vol)
+    greeks = price_and_greeks_batch(spots, strikes, expiries, RISK_FREE_RATE, greek_vols, 'call')
+
+    results_df = pd.DataFrame({
+        'Spot': chain['Spot'],
+        'Strike': chain['Strike'],
+        'Market_Price': market_prices,
+        'Delta': greeks['Delta'],
+        'Gamma': greeks['Gamma'],
+        'Vega': greeks['Vega'],
+        'Theta': greeks['Theta'],
+        'Real_Vol': current_vol,
+        'Implied_Vol': implied_vols
+    })
+    return results_df, chain
+
+
+def save_chain(chain_df, chain, date):
+    from src.chain_store import OptionChainStore
+
+    chain_df.to_csv(CHAIN_CSV, index=False)
+
+    # Keep every snapshot in the historical chain store (date-partitioned, memory-mapped)
+    chain_store = OptionChainStore("data/chains")
+    chain_store.append(chain_df.assign(Expiry_Days=chain['Expiry_Days'].values, Type=chain['Type'].values),
+                       date=date)
+
+
+def find_signals(results_df, current_spot):
+    """
+    Runs the strategy (Polynomial Fit + Straddles). Returns (analyzed_df, trades).
+    """
+    from src.strategies import VolatilityStrategy
+
+    strategy = VolatilityStrategy(volatility_threshold=0.015)
+    with stage('run.strategy'):
+        analyzed_df = strategy.generate_signals(results_df, current_spot)
+
     trades = strategy.get_trade_log(analyzed_df)
-    
+
     print(f"\n--- ALGORITHMIC SIGNALS GENERATED: {len(trades)} ---")
     if not trades.empty:
         print(trades[['Strike', 'Market_Price', 'Implied_Vol', 'Fair_IV', 'Signal']].head().to_string(index=False))
-        
-        # 4. RUN RISK MANAGEMENT (Greeks + VaR + Stress Test)
-        rm = RiskManager(lot_size=25)
-        portfolio_risk = rm.calculate_portfolio_risk(trades)
-        
-        if portfolio_risk:
-            print(f"\n=============================================")
-            print(f"      RISK MANAGEMENT REPORT (CRO VIEW)      ")
-            print(f"=============================================")
-            print(f"NET DELTA: {portfolio_risk['Net_Delta']:.2f} (Directional Risk)")
-            print(f"NET GAMMA: {portfolio_risk['Net_Gamma']:.4f} (Acceleration Risk)")
-            print(f"NET VEGA:  {portfolio_risk['Net_Vega']:.2f} (Volatility Exposure)")
-            print(f"NET THETA: {portfolio_risk['Net_Theta']:.2f} (Time Decay/Day)")
-            print(f"---------------------------------------------")
-            
-            # VaR Calculation
-            var = rm.calculate_var(portfolio_risk['Net_Delta'], current_spot, current_vol)
-            print(f"VaR (1-Day, 95%): ₹{var:,.2f}")
-            
-            # Stress Test (-5% Crash)
-            crash_pnl = rm.stress_test(portfolio_risk['Net_Delta'], portfolio_risk['Net_Gamma'], current_spot)
-            print(f"STRESS TEST (-5% Crash): P&L Impact = ₹{crash_pnl:,.2f}")
-            
-            print(f"---------------------------------------------")
-            print(f"HEDGE ACTION: {portfolio_risk['Futures_Hedge_Lots']} Lots of Nifty Futures")
-            print(f"=============================================")
+    return analyzed_df, trades
 
-    # Save
-    analyzed_df.to_csv("data/option_chain_output.csv", index=False)
-    # ... previous code inside run_analysis ...
-    print("\nData saved. Launching Dashboard...")
-    
-    # --- NEW: RUN BACKTEST ON FETCHED DATA ---
+
+def report_risk(trades, nifty_data, current_spot, current_vol):
+    """
+    Risk management report (Greeks + VaR + Stress Test) for the signalled trades.
+    """
+    import numpy as np
+    from src.risk_manager import RiskManager
+
+    if trades.empty:
+        return
+
+    rm = RiskManager(lot_size=25)
+    portfolio_risk = rm.calculate_portfolio_risk(trades)
+    if not portfolio_risk:
+        return
+
+    print(f"\n=============================================")
+    print(f"      RISK MANAGEMENT REPORT (CRO VIEW)      ")
+    print(f"=============================================")
+    print(f"NET DELTA: {portfolio_risk['Net_Delta']:.2f} (Directional Risk)")
+    print(f"NET GAMMA: {portfolio_risk['Net_Gamma']:.4f} (Acceleration Risk)")
+    print(f"NET VEGA:  {portfolio_risk['Net_Vega']:.2f} (Volatility Exposure)")
+    print(f"NET THETA: {portfolio_risk['Net_Theta']:.2f} (Time Decay/Day)")
+    print(f"---------------------------------------------")
+
+    # VaR Calculation
+    var = rm.calculate_var(portfolio_risk['Net_Delta'], current_spot, current_vol)
+    print(f"VaR (1-Day, 95%): ₹{var:,.2f}")
+
+    # Full-Revaluation VaR/ES (captures Gamma & Vega) on historical spot/vol moves
+    full_var = rm.calculate_full_revaluation_var(
+        trades, current_spot, current_vol, method='historical',
+        spot_returns=np.ravel(nifty_data['Returns'].to_numpy()),
+        vol_changes=np.ravel(nifty_data['Volatility'].diff().fillna(0).to_numpy()))
+    print(f"Full-Reval VaR (1-Day, 95%): ₹{full_var['VaR']:,.2f} | ES: ₹{full_var['Expected_Shortfall']:,.2f}")
+
+    # Stress Test (-5% Crash)
+    crash_pnl = rm.stress_test(portfolio_risk['Net_Delta'], portfolio_risk['Net_Gamma'], current_spot)
+    print(f"STRESS TEST (-5% Crash): P&L Impact = ₹{crash_pnl:,.2f}")
+
+    print(f"---------------------------------------------")
+    print(f"HEDGE ACTION: {portfolio_risk['Futures_Hedge_Lots']} Lots of Nifty Futures")
+    print(f"=============================================")
+
+
+def run_backtest(nifty_data, engine='loop', output=BACKTEST_CSV):
     from src.backtester import Backtester
-    
+
     print("\n---------------------------------------------")
     print(">>> STARTING HISTORICAL BACKTEST (6 Months) <<<")
     bt = Backtester(initial_capital=1000000)
-    
-    equity_df = bt.run_backtest(nifty_data)
-    
-    # --- NEW: SAVE RESULTS FOR DASHBOARD ---
-    equity_df.to_csv("data/backtest_results.csv", index=False)
-    print("Backtest results saved to data/backtest_results.csv")
-    
+
+    with stage('run.backtest'):
+        equity_df = bt.run_backtest(nifty_data, engine=engine)
+
+    # --- SAVE RESULTS FOR DASHBOARD ---
+    equity_df.to_csv(output, index=False)
+    print(f"Backtest results saved to {output}")
+
     final_equity = equity_df['Equity'].iloc[-1]
     roi = ((final_equity - 1000000) / 1000000) * 100
-    
+
     print(f"Final Portfolio Value: ₹{final_equity:,.2f}")
     print(f"Total ROI: {roi:.2f}%")
     print("---------------------------------------------")
-    
-    # Launch Dashboard
-    plot_dashboard()
-    
+    return equity_df
+
+
+def show_dashboard(csv_path=CHAIN_CSV, output=DASHBOARD_PNG, headless=False):
+    from src.visualization import plot_dashboard
+
+    with stage('run.dashboard'):
+        plot_dashboard(csv_path, output_path=output, show=not headless and _has_display())
+
+
+def run_analysis(period="6mo", offline=False, headless=False):
+    """
+    Full pipeline: fetch, chain, strategy, risk, backtest, then the dashboard.
+    """
+    loader, nifty_data, current_spot, current_vol = fetch_market(period, offline)
+    results_df, chain = build_chain(loader, current_spot, current_vol)
+    analyzed_df, trades = find_signals(results_df, current_spot)
+    report_risk(trades, nifty_data, current_spot, current_vol)
+
+    # Save
+    save_chain(analyzed_df, chain, nifty_data.index[-1])
+    print("\nData saved. Launching Dashboard...")
+
+    run_backtest(nifty_data)
+    show_dashboard(headless=headless)
+
+
+def run_profiled(target=run_analysis, deep=False, output_prefix="data/profile"):
+    """
+    Runs `target` with instrumentation on and exports per-stage timings as
+    JSON and Prometheus text. deep=True adds cProfile + tracemalloc.
+    """
+    with instrumentation.capture(profile=deep, memory=deep,
+                                 profile_path=f"{output_prefix}.pstats" if deep else None):
+        with stage('run.total'):
+            target()
+
+    instrumentation.to_json(f"{output_prefix}.json")
+    instrumentation.to_prometheus(f"{output_prefix}.prom")
+    print(f"\n--- PROFILE (saved to {output_prefix}.json / .prom) ---")
+    for name, stats in sorted(instrumentation.report()['Stages'].items(), key=lambda kv: -kv[1]['Total_s']):
+        print(f"{name:<32} {stats['Calls']:>7} calls {stats['Total_s']:>10.4f}s")
+
+
+# --- CLI ---
+
+def cmd_fetch(args):
+    _, nifty_data, _, _ = fetch_market(args.period, args.offline)
+    print(f"{len(nifty_data)} bars from {nifty_data.index[0].date()} to {nifty_data.index[-1].date()}")
+
+
+def cmd_chain(args):
+    loader, nifty_data, spot, vol = fetch_market(args.period, args.offline)
+    results_df, chain = build_chain(loader, spot, vol)
+    save_chain(results_df, chain, nifty_data.index[-1])
+    print(f"Chain of {len(results_df)} strikes saved to {CHAIN_CSV}")
+
+
+def cmd_signals(args):
+    loader, _, spot, vol = fetch_market(args.period, args.offline)
+    results_df, _ = build_chain(loader, spot, vol)
+    find_signals(results_df, spot)
+
+
+def cmd_risk(args):
+    loader, nifty_data, spot, vol = fetch_market(args.period, args.offline)
+    results_df, _ = build_chain(loader, spot, vol)
+    _, trades = find_signals(results_df, spot)
+    report_risk(trades, nifty_data, spot, vol)
+
+
+def cmd_backtest(args):
+    _, nifty_data, _, _ = fetch_market(args.period, args.offline)
+    run_backtest(nifty_data, engine=args.engine, output=args.output)
+
+
+def cmd_intraday(args):
+    from src.intraday import IntradayBacktester
+
+    bt = IntradayBacktester(initial_capital=1000000, entry_tenor_days=args.tenor_days,
+                            square_off=not args.hold_overnight, max_positions=args.max_positions)
+    with stage('run.intraday'):
+        sessions = bt.run_file(args.input, chunksize=args.chunksize, equity_output=args.equity_output)
+    sessions.to_csv(args.output, index=False)
+
+    summary = bt.summary
+    print(f"{summary['Bars']:,} bars / {summary['Sessions']} sessions at {summary['Bars_Per_Second'] * 60:,.0f} bars/min")
+    print(f"Trades: {summary['Trades']} | ROI: {summary['ROI']:.2f}% | Max Drawdown: {summary['Max_Drawdown']:.2f}%")
+    print(f"Session-close equity saved to {args.output}")
+
+
+def cmd_dashboard(args):
+    show_dashboard(args.input, args.output, headless=args.headless)
+
+
+def cmd_sweep(args, sweep_argv):
+    from src import sweep
+    parser = sweep.build_parser(argparse.ArgumentParser(prog="main.py sweep",
+                                                        description="Parallel parameter sweep for the Backtester"))
+    sweep.main(parser.parse_args(sweep_argv))
+
+
+def _add_shared_options(parser, defaults=True):
+    # Accepted before or after the command; subcommand copies default to SUPPRESS
+    # so they never overwrite a value given before the command name
+    default = (lambda value: value) if defaults else (lambda value: argparse.SUPPRESS)
+    parser.add_argument('--profile', action='store_true', default=default(False),
+                        help="Record per-stage timings (JSON + Prometheus dump)")
+    parser.add_argument('--deep-profile', action='store_true', default=default(False),
+                        help="Also capture cProfile and tracemalloc")
+    parser.add_argument('--headless', action='store_true', default=default(False),
+                        help="Never open a plot window (implied without a display)")
+    parser.add_argument('--period', default=default('6mo'), help="History to fetch (default: 6mo)")
+    parser.add_argument('--offline', action='store_true', default=default(False),
+                        help="Serve market data from the local cache only")
+    return parser
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Nifty options analysis + backtest. "
+                                                 "Without a command, runs the full pipeline.")
+    _add_shared_options(parser)
+    shared = _add_shared_options(argparse.ArgumentParser(add_help=False), defaults=False)
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+
+    p = commands.add_parser('fetch', parents=[shared], help="Fetch/refresh market data and print a snapshot")
+    p.set_defaults(handler=cmd_fetch)
+    p = commands.add_parser('chain', parents=[shared], help=f"Build the option chain (IV + Greeks) and save it to {CHAIN_CSV}")
+    p.set_defaults(handler=cmd_chain)
+    p = commands.add_parser('signals', parents=[shared], help="Generate strategy signals on a fresh chain")
+    p.set_defaults(handler=cmd_signals)
+    p = commands.add_parser('risk', parents=[shared], help="Signals plus the risk management report")
+    p.set_defaults(handler=cmd_risk)
+
+    p = commands.add_parser('backtest', parents=[shared], help="Run the historical backtest")
+    p.add_argument('--engine', choices=['loop', 'columnar'], default='columnar', help="Backtest engine (default: columnar)")
+    p.add_argument('--output', default=BACKTEST_CSV, help=f"Equity curve CSV (default: {BACKTEST_CSV})")
+    p.set_defaults(handler=cmd_backtest)
+
+    p = commands.add_parser('intraday', parents=[shared], help="Stream a minute-bar file (CSV/Parquet) through the backtester")
+    p.add_argument('--input', required=True, help="Bars file: timestamp column first (CSV) and a Close column")
+    p.add_argument('--chunksize', type=int, default=500000, help="Bars read per block (bounds memory; default: 500000)")
+    p.add_argument('--tenor-days', type=float, default=7, help="Calendar days from entry to option expiry (default: 7)")
+    p.add_argument('--max-positions', type=int, default=1, help="Concurrent positions (default: 1)")
+    p.add_argument('--hold-overnight', action='store_true', help="Do not square off at each session close")
+    p.add_argument('--equity-output', help="Also append the per-bar equity curve to this CSV")
+    p.add_argument('--output', default=INTRADAY_CSV, help=f"Session-close equity CSV (default: {INTRADAY_CSV})")
+    p.set_defaults(handler=cmd_intraday)
+
+    p = commands.add_parser('dashboard', parents=[shared], help="Render the option analytics charts (see also: streamlit run app.py)")
+    p.add_argument('--input', default=CHAIN_CSV, help=f"Chain CSV to plot (default: {CHAIN_CSV})")
+    p.add_argument('--output', default=DASHBOARD_PNG, help=f"Image to save (default: {DASHBOARD_PNG})")
+    p.set_defaults(handler=cmd_dashboard)
+
+    # Sweep options are parsed by src.sweep itself (try `main.py sweep --help`)
+    p = commands.add_parser('sweep', add_help=False, help="Parallel parameter sweep (options as in src.sweep)")
+    p.set_defaults(handler=cmd_sweep)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command != 'sweep':
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+
+    if args.command == 'sweep':
+        target = lambda: cmd_sweep(args, extra)
+    elif args.command:
+        target = lambda: args.handler(args)
+    else:
+        target = lambda: run_analysis(args.period, args.offline, args.headless)
+
+    if args.profile or args.deep_profile:
+        run_profiled(target, deep=args.deep_profile)
+    else:
+        target()
+
 
 if __name__ == "__main__":
-    run_analysis()
\ No newline at end of file
+    main()
@@ -1,30 +1,57 @@
 import pandas as pd
 import numpy as np
-from src.pricing_engine import BlackScholes
-from src.strategies import VolatilityStrategy
+from src.pricing_engine import price_scalar, price_batch
+from src.strategies import VolatilityStrategy, SIGNAL_SIDES
 from src.risk_manager import RiskManager
+from src.position_book import PositionBook, bar_times
+from src.instrumentation import instrument
+
+# Option legs opened per signal code (Is_Call per leg, all at the ATM strike)
+SIGNAL_LEGS = ((), (True,), (True,), (True, False), (True, False))
+
 
 class Backtester:
-    def __init__(self, initial_capital=1000000):
+    def __init__(self, initial_capital=1000000, pricing_cache=None, volatility_threshold=0.015,
+                 profit_target=2000, stop_loss=-1000, entry_tenor_days=25, max_positions=1,
+                 slippage_pct=0.001, brokerage_per_order=20):
         self.capital = initial_capital
         self.balance = initial_capital
-        self.positions = [] # List of active trades
+        self.positions = PositionBook() # Open option legs (structure of arrays)
         self.equity_curve = []
         self.transaction_log = []
         
         # Costs
-        self.brokerage_per_order = 20 # Flat fee (e.g., Zerodha)
-        self.slippage_pct = 0.001     # 0.1% impact on entry/exit
+        self.brokerage_per_order = brokerage_per_order # Flat fee (e.g., Zerodha: 20)
+        self.slippage_pct = slippage_pct               # 0.1% impact on entry/exit
+        
+        # Strategy knobs (tunable via src.sweep)
+        self.volatility_threshold = volatility_threshold
+        self.profit_target = profit_target
+        self.stop_loss = stop_loss
+        self.entry_tenor_days = entry_tenor_days  # Days to expiry of the options bought/sold
+        self.max_positions = max_positions        # Concurrent positions (1 = only enter when flat)
+        
+        # Optional PricingCache: reuses evaluations for repeated (spot, strike, T, vol) tuples.
+        # Used for entry prices and per-bar marks wherever the book is marked bar by bar;
+        # the columnar engine's precomputation and path scans stay batched
+        self.pricing_cache = pricing_cache
 
-    def run_backtest(self, price_data):
+    @instrument('backtest.run')
+    def run_backtest(self, price_data, engine='loop'):
         """
         Simulates trading over a historical price series.
+        engine='loop' replays bar by bar; engine='columnar' precomputes strikes,
+        prices and signals as arrays and produces the same trades and equity.
         """
         print(f"Starting Backtest with ₹{self.capital:,.2f}...")
         
-        strategy = VolatilityStrategy(volatility_threshold=0.015)
+        if engine == 'columnar':
+            return self._run_columnar(price_data)
+        
+        strategy = VolatilityStrategy(volatility_threshold=self.volatility_threshold)
+        times = bar_times(price_data.index)
         
-        for i, row in price_data.iterrows():
+        for (i, row), now in zip(price_data.iterrows(), times):
             # --- SCALAR FIX STARTS HERE ---
             current_spot = row['Close']
             current_vol = row['Volatility']
@@ -45,17 +72,16 @@ class Backtester:
             date = row.index if isinstance(row.index, pd.Timestamp) else i
             
             # 1. Update Value of Existing Positions (Mark-to-Market)
-            self._update_positions(current_spot, current_vol)
+            self._update_positions(current_spot, current_vol, now)
             
-            # 2. Check for Exits
-            self._check_exits(current_spot)
+            # 2. Check for Exits (targets, stops and expiry settlement)
+            self._check_exits(now)
             
             # 3. Generate New Entry Signals
             atm_strike = round(current_spot / 50) * 50
             
             # Simulate Option Price
-            bs = BlackScholes(current_spot, atm_strike, 25/365, 0.07, current_vol, 'call')
-            theo_price = bs.calculate_price()
+            theo_price = self._price_option(current_spot, atm_strike, self.entry_tenor_days/365, current_vol)
             
             # Create a dummy row for strategy
             dummy_row = pd.DataFrame([{
@@ -65,54 +91,182 @@ class Backtester:
             
             # Run Strategy
             signals = strategy.generate_signals(dummy_row, current_spot)
-            trade_signal = signals.iloc[0]['Signal']
+            code = int(signals.iloc[0]['Signal_Code'])
             
             # 4. Execute Trade
-            if "BUY" in trade_signal and len(self.positions) == 0:
-                self._execute_trade("BUY", atm_strike, theo_price, date)
-            elif "SELL" in trade_signal and len(self.positions) == 0:
-                self._execute_trade("SELL", atm_strike, theo_price, date)
+            if SIGNAL_SIDES[code] != 0 and self.positions.n_positions < self.max_positions:
+                prices = [theo_price if is_call else
+                          self._price_option(current_spot, atm_strike, self.entry_tenor_days/365, current_vol, False)
+                          for is_call in SIGNAL_LEGS[code]]
+                self._execute_trade(code, atm_strike, prices, date, now)
                 
             # Track Equity
-            total_equity = self.balance + sum(p['PnL'] for p in self.positions)
+            total_equity = self.balance + self.positions.total_pnl()
             self.equity_curve.append({'Date': date, 'Equity': total_equity})
             
         return pd.DataFrame(self.equity_curve)
 
-    def _execute_trade(self, side, strike, price, date):
+    def _run_columnar(self, price_data):
+        """
+        Columnar engine: everything that does not depend on position state is
+        computed for all bars up front. With max_positions=1 the remaining loop
+        only jumps between events (entries and exits); while a position is open
+        its P&L path is marked in vectorized blocks and the first exit bar is
+        found with a mask. Otherwise the whole book is marked once per bar.
+        """
+        spots = _column_values(price_data, 'Close')
+        vols = _column_values(price_data, 'Volatility')
+        dates = price_data.index
+        times = bar_times(dates)
+
+        strategy = VolatilityStrategy(volatility_threshold=self.volatility_threshold)
+
+        # 1. Stateless precomputation for every bar
+        atm_strikes = np.round(spots / 50) * 50
+        call_prices = price_batch(spots, atm_strikes, self.entry_tenor_days/365, 0.07, vols, 'call')
+        put_prices = price_batch(spots, atm_strikes, self.entry_tenor_days/365, 0.07, vols, 'put')
+        # Single-quote snapshots have no smile fit, so only Strategy B can fire
+        codes = strategy.classify_signals(np.nan, vols, atm_strikes, spots)
+        sides = SIGNAL_SIDES[codes]
+
+        def enter(i):
+            prices = [float(call_prices[i]) if is_call else float(put_prices[i]) for is_call in SIGNAL_LEGS[codes[i]]]
+            self._execute_trade(int(codes[i]), int(atm_strikes[i]), prices, dates[i], times[i])
+
+        if self.max_positions != 1:
+            equity = self._run_columnar_stacked(spots, vols, times, sides, enter)
+        else:
+            equity = self._run_events(spots, vols, times, sides, enter)
+        return pd.DataFrame({'Date': dates, 'Equity': equity})
+
+    def _run_events(self, spots, vols, times, sides, enter, force_exit=None):
+        """
+        Stateful event loop over NumPy buffers for max_positions=1. Resumable:
+        a position still open at the last bar stays in the book, so chunked
+        callers can feed consecutive blocks of bars. force_exit marks bars
+        where any open position is closed (e.g. session square-off).
+        Returns the equity per bar.
+        """
+        n = len(spots)
+        signal_bars = np.flatnonzero(sides)
+        equity = np.empty(n)
+        i = 0
+
+        while i < n:
+            if len(self.positions):
+                exit_bar, pnl = self._scan_position(spots, vols, times, i, force_exit=force_exit)
+                end = n if exit_bar is None else exit_bar
+                equity[i:end] = self.balance + pnl[:end - i]
+
+                if exit_bar is None:
+                    self.positions.mark(spots[-1], vols[-1], times[-1])
+                    break
+
+                self.balance += pnl[exit_bar - i]
+                self.positions.clear()
+                i = exit_bar
+            else:
+                # Flat: skip straight to the next bar with a signal
+                k = np.searchsorted(signal_bars, i)
+                if k == len(signal_bars):
+                    equity[i:] = self.balance
+                    break
+                equity[i:signal_bars[k]] = self.balance
+                i = signal_bars[k]
+
+            # Entry check on bar i (after any exit on the same bar)
+            if sides[i] != 0:
+                enter(i)
+            equity[i] = self.balance
+            i += 1
+
+        return equity
+
+    def _run_columnar_stacked(self, spots, vols, times, sides, enter, force_exit=None):
+        # Several concurrent positions: one batched mark / masked exit per bar
+        equity = np.empty(len(spots))
+        for i in range(len(spots)):
+            if len(self.positions):
+                self._update_positions(spots[i], vols[i], times[i])
+                self._check_exits(times[i])
+                if force_exit is not None and force_exit[i] and len(self.positions):
+                    self.balance += self.positions.close(np.ones(len(self.positions), dtype=bool))
+            if sides[i] != 0 and self.positions.n_positions < self.max_positions:
+                enter(i)
+            equity[i] = self.balance + self.positions.total_pnl()
+        return equity
+
+    @instrument('backtest.scan_position')
+    def _scan_position(self, spots, vols, times, start, block=32, force_exit=None):
+        """
+        Marks the open position forward from bar `start` in growing blocks until
+        it hits the profit target or stop loss, its legs expire, or a
+        force_exit bar is reached. With
+        max_positions=1 the book holds one position with a common expiry.
+        Returns (exit_bar or None, position P&L path).
+        """
+        book = self.positions
+        expiry = book.Expiry.min()
+        pnl_blocks = []
+        begin = start
+        while begin < len(spots):
+            end = min(begin + block, len(spots))
+            pnl = book.mark_path(spots[begin:end], vols[begin:end], times[begin:end]).sum(axis=1)
+            pnl_blocks.append(pnl)
+
+            exits = (pnl > self.profit_target) | (pnl < self.stop_loss) | (times[begin:end] >= expiry)
+            if force_exit is not None:
+                exits |= force_exit[begin:end]
+            hits = np.flatnonzero(exits)
+            if hits.size:
+                return begin + hits[0], np.concatenate(pnl_blocks)
+            begin = end
+            block = min(block * 2, 4096)
+        return None, np.concatenate(pnl_blocks)
+
+    def _price_option(self, spot, strike, T, vol, is_call=True):
+        if self.pricing_cache is not None:
+            return self.pricing_cache.price(spot, strike, T, 0.07, vol, 'call' if is_call else 'put')
+        return price_scalar(spot, strike, T, 0.07, vol, is_call)
+
+    def _execute_trade(self, code, strike, prices, date, now, expiry=None):
+        """
+        Opens the position for a signal code: one leg per SIGNAL_LEGS entry at
+        the given prices, all expiring at `expiry` (default: entry_tenor_days
+        after `now`). Each leg is a separate order (brokerage + slippage).
+        """
         qty = 25 # 1 Lot
-        cost = price * qty
-        slippage = cost * self.slippage_pct
-        total_cost = self.brokerage_per_order + slippage
-        
-        self.balance -= total_cost
-        
-        self.positions.append({
-            'Entry_Date': date,
-            'Type': side,
-            'Strike': strike,
-            'Entry_Price': price,
-            'Qty': qty,
-            'PnL': 0
-        })
-        self.transaction_log.append(f"{date}: {side} {strike} Call @ {price:.2f}")
-
-    def _update_positions(self, spot, vol):
-        for pos in self.positions:
-            bs = BlackScholes(spot, pos['Strike'], 20/365, 0.07, vol, 'call')
-            curr_price = bs.calculate_price()
+        side = "BUY" if SIGNAL_SIDES[code] > 0 else "SELL"
+        legs = SIGNAL_LEGS[code]
+        for is_call, price in zip(legs, prices):
+            cost = price * qty
+            slippage = cost * self.slippage_pct
+            total_cost = self.brokerage_per_order + slippage
             
-            if pos['Type'] == 'BUY':
-                pos['PnL'] = (curr_price - pos['Entry_Price']) * pos['Qty']
-            else:
-                pos['PnL'] = (pos['Entry_Price'] - curr_price) * pos['Qty']
-
-    def _check_exits(self, spot):
-        active_pos = []
-        for pos in self.positions:
-            # Profit Target: 2000 | Stop Loss: -1000
-            if pos['PnL'] > 2000 or pos['PnL'] < -1000:
-                self.balance += pos['PnL']
-            else:
-                active_pos.append(pos)
-        self.positions = active_pos
\ No newline at end of file
+            self.balance -= total_cost
+            self.transaction_log.append(f"{date}: {side} {strike} {'Call' if is_call else 'Put'} @ {price:.2f}")
+
+        if expiry is None:
+            expiry = now + self.entry_tenor_days
+        self.positions.add(np.array(legs), SIGNAL_SIDES[code], strike, expiry,
+                           qty, np.array(prices, dtype=float), now)
+
+    @instrument('backtest.update_positions')
+    def _update_positions(self, spot, vol, now):
+        # Mark-to-market of every leg at its real time to expiry (through the cache when set)
+        self.positions.mark(spot, vol, now, self._price_option if self.pricing_cache is not None else None)
+
+    @instrument('backtest.check_exits')
+    def _check_exits(self, now):
+        # Profit Target (default 2000) | Stop Loss (default -1000) | Expiry (settles at intrinsic)
+        exits = self.positions.exit_mask(self.profit_target, self.stop_loss, now)
+        if exits.any():
+            self.balance += self.positions.close(exits)
+
+
+def _column_values(price_data, column):
+    # yfinance can return a one-column DataFrame per field (MultiIndex columns)
+    values = price_data[column]
+    if isinstance(values, pd.DataFrame):
+        values = values.iloc[:, 0]
+    return values.to_numpy(dtype=float)
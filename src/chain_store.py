@@ -0,0 +1,370 @@
+import os
+import numpy as np
+import pandas as pd
+
+# On-disk record layout for one option quote
+CHAIN_DTYPE = np.dtype([
+    ('Timestamp', '<i8'),  # Snapshot time (ns since epoch)
+    ('Expiry', '<i8'),     # Expiry date (days since epoch)
+    ('Strike', '<f8'),
+    ('Is_Call', 'i1'),
+    ('Price', '<f8'),
+    ('IV', '<f8'),
+    ('Delta', '<f8'),
+    ('Gamma', '<f8'),
+    ('Vega', '<f8'),
+    ('Theta', '<f8'),
+])
+
+# Per-date sidecar: one "part-file timestamp..." line per part listing its snapshots
+INDEX_FILE = 'snapshots.idx'
+
+# DataFrame column aliases accepted on append (first match wins)
+_COLUMN_ALIASES = {
+    'Price': ['Price', 'Market_Price'],
+    'IV': ['IV', 'Implied_Vol'],
+}
+
+
+class OptionChainStore:
+    """
+    Persistent, date-partitioned columnar store for historical option chains.
+
+    Layout: <root>/<YYYY-MM-DD>/part-NNNNN.chain, each part a flat array of
+    CHAIN_DTYPE records sorted by (Expiry, Strike, Is_Call, Timestamp), plus
+    a snapshots.idx sidecar naming the snapshot timestamps in each part.
+    Appends write a new part and look the timestamp up in the sidecar; an
+    existing part is only rewritten when it already holds that snapshot
+    (a re-run replaces it). Reads are
+    memory-mapped: "expiry E on date D" is a contiguous, zero-copy slice found
+    with binary search, and a strike's history touches only the matching rows
+    of each partition, so chains far larger than RAM can be scanned.
+    """
+    def __init__(self, root="data/chains"):
+        self.root = root
+        self._maps = {}     # Open memmaps per part file
+        self._indexes = {}  # Partition dir -> _SnapshotIndex
+
+    # --- WRITE PATH ---
+
+    def append(self, chain, date, expiry=None, timestamp=None):
+        """
+        Appends one chain snapshot for `date`. Needs Strike plus Type ('Call'/'Put')
+        or Is_Call; the expiry comes from an 'Expiry' column, 'Expiry_Days'
+        (relative to date) or the `expiry` argument. Missing Greeks are stored as NaN.
+        Re-appending a snapshot with the same (date, timestamp) replaces it, so
+        re-running a day's chain never duplicates rows.
+        """
+        date = pd.Timestamp(date).normalize()
+        n = len(chain)
+        records = np.zeros(n, dtype=CHAIN_DTYPE)
+
+        records['Timestamp'] = pd.Timestamp(timestamp if timestamp is not None else date).as_unit('ns').value
+        if 'Expiry' in chain:
+            expiries = pd.to_datetime(chain['Expiry']).to_numpy(dtype='datetime64[D]')
+        elif 'Expiry_Days' in chain:
+            expiries = (np.datetime64(date.date(), 'D')
+                        + chain['Expiry_Days'].to_numpy(dtype='int64').astype('timedelta64[D]'))
+        elif expiry is not None:
+            expiries = np.full(n, np.datetime64(pd.Timestamp(expiry).date(), 'D'))
+        else:
+            raise ValueError("Chain needs an 'Expiry'/'Expiry_Days' column or an expiry argument")
+        records['Expiry'] = expiries.astype('int64')
+
+        records['Strike'] = chain['Strike'].to_numpy(dtype=float)
+        if 'Is_Call' in chain:
+            records['Is_Call'] = chain['Is_Call'].to_numpy(dtype=bool)
+        elif 'Type' in chain:
+            records['Is_Call'] = chain['Type'].astype(str).str.lower().to_numpy() == 'call'
+        else:
+            records['Is_Call'] = 1  # Chains without a Type column are call chains
+
+        for field in ('Price', 'IV', 'Delta', 'Gamma', 'Vega', 'Theta'):
+            column = next((c for c in _COLUMN_ALIASES.get(field, [field]) if c in chain), None)
+            records[field] = chain[column].to_numpy(dtype=float) if column else np.nan
+
+        records = records[np.lexsort((records['Timestamp'], records['Is_Call'], records['Strike'], records['Expiry']))]
+
+        partition = self._partition_dir(date)
+        os.makedirs(partition, exist_ok=True)
+        index = self._snapshot_index(date)
+        name = f"part-{index.next_part:05d}.chain"
+        part = os.path.join(partition, name)
+        with open(part, 'wb') as f:
+            f.write(records.tobytes())
+
+        # The new part is on disk first, so a crash below leaves a duplicate, never a loss
+        stamps = [int(records['Timestamp'][0])] if n else []
+        stale = [old for stamp in stamps for old in index.owners.get(stamp, ())]
+        index.add(name, stamps)
+        if stale:
+            for old in stale:
+                self._drop_snapshot(partition, old, stamps[0])
+            self._write_index(partition)
+        else:
+            with open(os.path.join(partition, INDEX_FILE), 'a') as f:
+                f.write(_index_line(name, stamps))
+        return part
+
+    def _drop_snapshot(self, partition, name, stamp):
+        # Removes the rows of snapshot `stamp` from one part (the whole file if nothing else is left)
+        path = os.path.join(partition, name)
+        records = self._open(path)
+        kept = np.array(records[records['Timestamp'] != stamp])
+        self._maps.pop(path, None)
+        del records
+        index = self._indexes[partition]
+        if len(kept) == 0:
+            os.remove(path)
+            index.remove(name)
+            return
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(kept.tobytes())
+        os.replace(tmp, path)
+        index.discard(name, stamp)
+
+    def _snapshot_index(self, date):
+        """
+        Snapshot index of one date, loaded from the sidecar once per store and
+        kept current by this store's writes. Parts the sidecar does not list
+        (stores written before it existed, or a crash between writing a part and
+        its sidecar line) are scanned once and added; removed parts are dropped.
+        """
+        partition = self._partition_dir(date)
+        index = self._indexes.get(partition)
+        if index is not None:
+            return index
+
+        index = self._indexes[partition] = _SnapshotIndex()
+        path = os.path.join(partition, INDEX_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    fields = line.split()
+                    if fields:
+                        index.add(fields[0], [int(stamp) for stamp in fields[1:]])
+
+        names = {os.path.basename(f) for f in self._part_files(date)}
+        missing, removed = names - index.parts.keys(), index.parts.keys() - names
+        for name in removed:
+            index.remove(name)
+        for name in sorted(missing):
+            index.add(name, np.unique(self._open(os.path.join(partition, name))['Timestamp']).tolist())
+        if missing or removed:
+            self._write_index(partition)
+        return index
+
+    def _write_index(self, partition):
+        tmp = os.path.join(partition, INDEX_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            f.writelines(_index_line(name, stamps) for name, stamps in sorted(self._indexes[partition].parts.items()))
+        os.replace(tmp, os.path.join(partition, INDEX_FILE))
+
+    def compact(self, date):
+        """
+        Merges all parts of a date into one sorted part, so slices on that date
+        become single zero-copy views again.
+        """
+        files = self._part_files(date)
+        if len(files) <= 1:
+            return
+        merged = np.concatenate([np.array(self._open(f)) for f in files])
+        merged = merged[np.lexsort((merged['Timestamp'], merged['Is_Call'], merged['Strike'], merged['Expiry']))]
+        for f in files:
+            self._maps.pop(f, None)
+        tmp = files[0] + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(merged.tobytes())
+        # Swap the merged part in before deleting the rest: a crash in between
+        # leaves duplicate rows, never an empty date
+        os.replace(tmp, files[0])
+        for f in files[1:]:
+            os.remove(f)
+        partition = self._partition_dir(date)
+        index = self._snapshot_index(date)
+        for name in list(index.parts):
+            index.remove(name)
+        index.add(os.path.basename(files[0]), np.unique(merged['Timestamp']).tolist())
+        self._write_index(partition)
+
+    # --- READ PATH ---
+
+    def dates(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(pd.Timestamp(d) for d in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, d)))
+
+    def slice(self, date, expiry, kind=None):
+        """
+        All strikes for `expiry` on `date` as CHAIN_DTYPE records. Zero-copy
+        memmap view when the date has a single part (see compact()).
+        kind: None (both), 'call' or 'put'.
+        """
+        expiry_day = _day_number(expiry)
+        views = []
+        for part in self._open_parts(date):
+            lo, hi = np.searchsorted(part['Expiry'], [expiry_day, expiry_day + 1])
+            views.append(part[lo:hi])
+        records = views[0] if len(views) == 1 else _concat(views)
+        return _filter_kind(records, kind)
+
+    def strike_history(self, strike, expiry=None, kind='call', start=None, end=None):
+        """
+        History of one strike across dates (optionally one expiry) as a DataFrame.
+        Uses binary search inside every (expiry) block, so each partition only
+        reads the pages holding the matching rows.
+        """
+        pieces = []
+        for date in self._dates_between(start, end):
+            for part in self._open_parts(date):
+                expiries = part['Expiry']
+                if expiry is not None:
+                    day = _day_number(expiry)
+                    bounds = [tuple(np.searchsorted(expiries, [day, day + 1]))]
+                else:
+                    # Block boundaries of each distinct expiry in the sorted part
+                    edges = np.flatnonzero(np.diff(expiries)) + 1
+                    starts = np.concatenate([[0], edges])
+                    bounds = list(zip(starts, np.concatenate([edges, [len(part)]])))
+                for lo, hi in bounds:
+                    a, b = np.searchsorted(part['Strike'][lo:hi], [strike, np.nextafter(strike, np.inf)])
+                    if b > a:
+                        pieces.append(part[lo + a:lo + b])
+
+        records = _filter_kind(_concat(pieces), kind)
+        return to_frame(records).sort_values(['Timestamp', 'Expiry']).reset_index(drop=True)
+
+    def scan(self, start=None, end=None):
+        """
+        Yields (date, records) for every part in the date range without loading
+        them into memory, for out-of-core passes over multi-year history.
+        """
+        for date in self._dates_between(start, end):
+            for part in self._open_parts(date):
+                yield date, part
+
+    # --- INTERNALS ---
+
+    def _partition_dir(self, date):
+        return os.path.join(self.root, pd.Timestamp(date).strftime('%Y-%m-%d'))
+
+    def _part_files(self, date):
+        partition = self._partition_dir(date)
+        if not os.path.isdir(partition):
+            return []
+        return sorted(os.path.join(partition, f) for f in os.listdir(partition) if f.endswith('.chain'))
+
+    def _open(self, path):
+        if path not in self._maps:
+            size = os.path.getsize(path)
+            self._maps[path] = (np.memmap(path, dtype=CHAIN_DTYPE, mode='r') if size
+                                else np.zeros(0, dtype=CHAIN_DTYPE))
+        return self._maps[path]
+
+    def _open_parts(self, date):
+        parts = [self._open(f) for f in self._part_files(date)]
+        return parts or [np.zeros(0, dtype=CHAIN_DTYPE)]
+
+    def _dates_between(self, start, end):
+        dates = self.dates()
+        if start is not None:
+            dates = [d for d in dates if d >= pd.Timestamp(start)]
+        if end is not None:
+            dates = [d for d in dates if d <= pd.Timestamp(end)]
+        return dates
+
+
+class _SnapshotIndex:
+    """
+    Which parts of one date hold which snapshot timestamps, in both
+    directions, so an append finds a colliding snapshot with one dict lookup.
+    """
+    def __init__(self):
+        self.parts = {}    # Part file name -> set of timestamps
+        self.owners = {}   # Timestamp -> set of part file names
+        self.next_part = 0 # One past the highest part number seen (parts may have been removed)
+
+    def add(self, name, stamps):
+        self.parts.setdefault(name, set()).update(stamps)
+        for stamp in stamps:
+            self.owners.setdefault(stamp, set()).add(name)
+        self.next_part = max(self.next_part, int(name[5:10]) + 1)
+
+    def discard(self, name, stamp):
+        self.parts[name].discard(stamp)
+        self._disown(name, stamp)
+
+    def remove(self, name):
+        for stamp in self.parts.pop(name):
+            self._disown(name, stamp)
+
+    def _disown(self, name, stamp):
+        names = self.owners.get(stamp)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del self.owners[stamp]
+
+
+def _index_line(name, stamps):
+    return " ".join([name] + [str(stamp) for stamp in sorted(stamps)]) + "\n"
+
+
+def _day_number(date):
+    return int(np.datetime64(pd.Timestamp(date).date(), 'D').astype('int64'))
+
+
+def _concat(views):
+    return np.concatenate(views) if views else np.zeros(0, dtype=CHAIN_DTYPE)
+
+
+def _filter_kind(records, kind):
+    if kind is None:
+        return records
+    return records[records['Is_Call'] == (1 if kind == 'call' else 0)]
+
+
+def to_frame(records):
+    """
+    CHAIN_DTYPE records -> DataFrame with readable Timestamp/Expiry/Type columns.
+    """
+    return pd.DataFrame({
+        'Timestamp': pd.to_datetime(np.asarray(records['Timestamp']), unit='ns'),
+        'Expiry': pd.to_datetime(np.asarray(records['Expiry']).astype('datetime64[D]')),
+        'Strike': records['Strike'],
+        'Type': np.where(records['Is_Call'] == 1, 'Call', 'Put'),
+        'Price': records['Price'],
+        'IV': records['IV'],
+        'Delta': records['Delta'],
+        'Gamma': records['Gamma'],
+        'Vega': records['Vega'],
+        'Theta': records['Theta'],
+    })
+
+
+if __name__ == "__main__":
+    # Smoke check in a temporary root: re-appended snapshots replace the old
+    # rows, and a store without a sidecar (older layout) is indexed on first use
+    import tempfile
+
+    chain = pd.DataFrame({'Strike': np.arange(23000, 25050, 50.0), 'Type': 'Call', 'Expiry_Days': 7,
+                          'Market_Price': 100.0, 'Implied_Vol': 0.15})
+    date = pd.Timestamp('2024-03-13')
+    stamps = [date + pd.Timedelta(hours=9, minutes=15 + i) for i in range(50)]
+    with tempfile.TemporaryDirectory() as root:
+        store = OptionChainStore(root)
+        for stamp in stamps:
+            store.append(chain, date, timestamp=stamp)
+        store.append(chain.assign(Market_Price=101.0), date, timestamp=stamps[10])
+        store.compact(date)
+        os.remove(os.path.join(store._partition_dir(date), INDEX_FILE))
+        OptionChainStore(root).append(chain.assign(Market_Price=102.0), date, timestamp=stamps[20])
+
+        records = np.concatenate([part for _, part in OptionChainStore(root).scan(date, date)])
+        assert len(records) == len(stamps) * len(chain), "duplicate snapshot rows"
+        prices = {int(stamps[i].value): p for i, p in ((0, 100.0), (10, 101.0), (20, 102.0))}
+        for stamp, price in prices.items():
+            assert (records['Price'][records['Timestamp'] == stamp] == price).all(), "snapshot not replaced"
+    print(f"Chain store OK: {len(stamps)} snapshots, re-appends replaced in place")
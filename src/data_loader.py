@@ -1,25 +1,263 @@
-import yfinance as yf
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from src.instrumentation import instrument
+
+VOL_WINDOW = 21  # Rolling window (trading days) for historical volatility
+EXCHANGE_TZ = 'Asia/Kolkata'
+SESSION_CLOSE_TIME = '15:30'  # NSE close: a daily bar is final after this
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'fixtures')
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# On-disk record layout for cached bars: timestamp + OHLCV + derived columns
+BAR_DTYPE = np.dtype([('Date', '<i8')] + [(c, '<f8') for c in BAR_COLUMNS + ['Returns', 'Volatility']])
+
+
+def _safe_name(ticker):
+    # "^NSEI" -> "NSEI", "RELIANCE.NS" -> "RELIANCE.NS"
+    return re.sub(r'[^A-Za-z0-9._-]', '', ticker) or 'ticker'
+
+
+def _period_start(period, last):
+    """
+    Start of a yfinance-style period ('5d', '6mo', '1y', 'ytd', 'max') ending at `last`.
+    """
+    if period in (None, 'max'):
+        return None
+    if period == 'ytd':
+        return pd.Timestamp(year=last.year, month=1, day=1)
+    match = re.fullmatch(r'(\d+)(d|wk|mo|y)', period)
+    if match is None:
+        raise ValueError(f"Unsupported period: {period}")
+    n, unit = int(match.group(1)), match.group(2)
+    offsets = {'d': pd.DateOffset(days=n), 'wk': pd.DateOffset(weeks=n),
+               'mo': pd.DateOffset(months=n), 'y': pd.DateOffset(years=n)}
+    return last - offsets[unit]
+
+
+def last_completed_session(now=None):
+    """
+    Date (naive, exchange-local) of the most recent weekday session that has
+    closed. Exchange holidays are not known here, so on a holiday this is a
+    session without a bar and callers fall back to their max-age check.
+    """
+    now = pd.Timestamp.now(tz=EXCHANGE_TZ) if now is None else pd.Timestamp(now)
+    if now.tz is not None:
+        now = now.tz_convert(EXCHANGE_TZ).tz_localize(None)
+    day = now.normalize()
+    if day.weekday() >= 5 or now < day + pd.Timedelta(SESSION_CLOSE_TIME + ':00'):
+        day -= pd.Timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= pd.Timedelta(days=1)
+    return day
+
+
+def _flatten_bars(data):
+    # yfinance returns (Price, Ticker) MultiIndex columns; keep one flat OHLCV frame
+    if isinstance(data.columns, pd.MultiIndex):
+        data = data.copy()
+        data.columns = data.columns.get_level_values(0)
+    data = data.reindex(columns=BAR_COLUMNS)
+    index = pd.DatetimeIndex(data.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    data.index = index
+    return data.sort_index()
+
+
+def yfinance_source(ticker, period=None, start=None, interval="1d"):
+    """
+    Default network source. yfinance is imported lazily so cached/offline
+    runs never pay for it. Uses Ticker.history rather than yf.download:
+    download() collects results in module-level state that every call
+    resets, so concurrent calls (MultiTickerLoader threads) can drop frames.
+    """
+    import yfinance as yf
+    history = yf.Ticker(ticker).history
+    if start is not None:
+        data = history(start=start, interval=interval)
+    else:
+        data = history(period=period, interval=interval)
+    return _flatten_bars(data)
+
+
+class CSVSource:
+    """
+    Local stand-in for the network: reads bars from a CSV file (Date index,
+    OHLCV columns), or from <dir>/<ticker>.csv when given a directory.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, ticker, period=None, start=None, interval="1d"):
+        path = self.path
+        if os.path.isdir(path):
+            path = os.path.join(path, f"{_safe_name(ticker)}.csv")
+        data = _flatten_bars(pd.read_csv(path, index_col=0, parse_dates=True))
+        if data.empty:
+            return data
+        if start is not None:
+            return data[data.index >= pd.Timestamp(start)]
+        window_start = _period_start(period, data.index[-1])
+        return data if window_start is None else data[data.index >= window_start]
+
+
+class BarCache:
+    """
+    Append-only binary bar file per ticker and interval, read via np.memmap.
+    Derived columns (Returns, Volatility) are stored alongside the bars and
+    updated incrementally from the cached tail when new bars are appended.
+    """
+    def __init__(self, cache_dir, ticker, interval="1d"):
+        self.path = os.path.join(cache_dir, f"{_safe_name(ticker)}_{interval}.bars")
+
+    def read(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return np.zeros(0, dtype=BAR_DTYPE)
+        return np.memmap(self.path, dtype=BAR_DTYPE, mode='r')
+
+    def write(self, bars, keep=0):
+        """
+        Appends `bars` after the first `keep` cached records (keep=0 rewrites
+        the file). Derived columns are continued from the kept tail.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        cached = self.read()
+        tail = np.array(cached[max(0, keep - VOL_WINDOW):keep])
+        del cached
+
+        records = np.zeros(len(bars), dtype=BAR_DTYPE)
+        records['Date'] = bars.index.as_unit('ns').asi8
+        for column in BAR_COLUMNS:
+            records[column] = bars[column].to_numpy(dtype=float)
+
+        # Incremental derived columns: only the new bars plus a VOL_WINDOW tail
+        close = pd.Series(np.concatenate([tail['Close'], records['Close']]))
+        returns = close.pct_change()
+        returns.iloc[:len(tail)] = tail['Returns']
+        volatility = returns.rolling(window=VOL_WINDOW).std() * np.sqrt(252)
+        records['Returns'] = returns.to_numpy()[len(tail):]
+        records['Volatility'] = volatility.to_numpy()[len(tail):]
+
+        mode = 'r+b' if keep else 'wb'
+        if not os.path.exists(self.path):
+            mode = 'wb'
+        with open(self.path, mode) as f:
+            f.truncate(keep * BAR_DTYPE.itemsize)
+            f.seek(keep * BAR_DTYPE.itemsize)
+            f.write(records.tobytes())
+
+
+def _bars_to_frame(records):
+    frame = pd.DataFrame({c: records[c] for c in BAR_COLUMNS + ['Returns', 'Volatility']},
+                         index=pd.DatetimeIndex(records['Date'].view('datetime64[ns]'), name='Date'))
+    return frame
+
 
 class DataLoader:
-    def __init__(self, ticker="^NSEI"):
+    def __init__(self, ticker="^NSEI", cache_dir="data/cache", interval="1d",
+                 offline=False, fixture_path=None, source=None, max_age=3600):
         self.ticker = ticker
-        
+        self.interval = interval
+        self.cache = BarCache(cache_dir, ticker, interval) if cache_dir else None
+        self.offline = offline            # Never touch the network; serve cache or fixture
+        self.fixture_path = fixture_path  # Local CSV used to seed an empty cache offline
+        self.source = source or yfinance_source
+        self.max_age = max_age            # Seconds a checked cache is trusted without asking the source
+
+    @instrument('data.fetch')
     def fetch_underlying_data(self, period="1y"):
         """
         Fetches historical data for the underlying asset (Nifty 50)
+        Repeat requests are served from the local bar cache; a refresh only
+        downloads bars from the last cached timestamp onwards.
         """
-        print(f"Fetching data for {self.ticker}...")
-        data = yf.download(self.ticker, period=period)
-        
-        # Calculate daily returns and historical volatility (annualized)
-        data['Returns'] = data['Close'].pct_change()
-        data['Volatility'] = data['Returns'].rolling(window=21).std() * np.sqrt(252)
-        
+        if self.cache is None:
+            print(f"Fetching data for {self.ticker}...")
+            data = self.source(self.ticker, period=period, interval=self.interval)
+            # Calculate daily returns and historical volatility (annualized)
+            data['Returns'] = data['Close'].pct_change()
+            data['Volatility'] = data['Returns'].rolling(window=VOL_WINDOW).std() * np.sqrt(252)
+            return data.dropna()
+
+        self._refresh_cache(period)
+
+        records = self.cache.read()
+        if len(records) == 0:
+            raise FileNotFoundError(f"No cached or fixture data available for {self.ticker}")
+
+        # Slice the requested window straight out of the memory-mapped file
+        dates = records['Date']
+        window_start = _period_start(period, pd.Timestamp(dates[-1]))
+        first = 0 if window_start is None else np.searchsorted(dates, window_start.value)
+        data = _bars_to_frame(np.array(records[first:]))
         return data.dropna()
 
+    def _refresh_cache(self, period):
+        records = self.cache.read()
+        count = len(records)
+
+        if self.offline:
+            if count == 0 and self.fixture_path:
+                print(f"Offline: seeding cache for {self.ticker} from {self.fixture_path}")
+                self.cache.write(CSVSource(self.fixture_path)(self.ticker, period='max', interval=self.interval))
+            return
+
+        last = pd.Timestamp(records['Date'][-1]) if count else None
+        first = pd.Timestamp(records['Date'][0]) if count else None
+        del records
+
+        if last is not None and not self._needs_backfill(period, first) and self._is_fresh(last):
+            return
+
+        try:
+            if last is None or self._needs_backfill(period, first):
+                # Cold cache, or the request reaches further back than the cache: full download
+                print(f"Fetching data for {self.ticker}...")
+                self.cache.write(self.source(self.ticker, period=period, interval=self.interval))
+            else:
+                # Re-fetch from the last cached bar: it may have been a partial bar
+                print(f"Refreshing {self.ticker} from {last.date()}...")
+                new_bars = self.source(self.ticker, start=last.strftime('%Y-%m-%d'), interval=self.interval)
+                new_bars = new_bars[new_bars.index >= last]
+                if not new_bars.empty:
+                    keep = count - 1 if new_bars.index[0] == last else count
+                    self.cache.write(new_bars, keep=keep)
+                else:
+                    os.utime(self.cache.path)  # Record the check for the max_age window
+        except Exception as e:
+            if count == 0:
+                raise
+            print(f"Refresh failed for {self.ticker} ({e}); serving cached data")
+
+    def _is_fresh(self, last_cached, now=None):
+        """
+        True when the cache was written/checked within max_age seconds, or
+        (daily bars) already holds the most recent completed session and was
+        written after that session's close, so its last bar is final rather
+        than a mid-session partial.
+        """
+        now = pd.Timestamp.now(tz=EXCHANGE_TZ) if now is None else pd.Timestamp(now)
+        written = os.path.getmtime(self.cache.path)
+        if now.timestamp() - written < self.max_age:
+            return True
+        if self.interval != "1d":
+            return False
+        session = last_completed_session(now)
+        close = (session + pd.Timedelta(SESSION_CLOSE_TIME + ':00')).tz_localize(EXCHANGE_TZ)
+        return last_cached.normalize() >= session and written >= close.timestamp()
+
+    def _needs_backfill(self, period, first_cached):
+        if period == 'max':
+            return True
+        window_start = _period_start(period, pd.Timestamp.now())
+        # A week of slack absorbs weekends/holidays at the start of the window
+        return window_start is not None and window_start < first_cached - pd.Timedelta(days=7)
+
     def generate_dummy_option_chain(self, spot_price, date):
         """
         Since free historical options data is rare, we SIMULATE an option chain
@@ -37,4 +275,86 @@ class DataLoader:
         chain['Expiry_Days'] = 30  # Assume 30 days to expiry for this test
         chain['Type'] = 'Call'     # Focus on Calls first
         
-        return chain
\ No newline at end of file
+        return chain
+
+
+class MultiTickerLoader:
+    """
+    Loads many underlyings concurrently (NIFTY, BANKNIFTY, FINNIFTY, stocks...).
+    Each ticker gets its own DataLoader (and cache file) and runs on a thread
+    pool, so total time tracks the slowest ticker rather than the sum.
+    A failing ticker is recorded in `errors` and left out of the panel.
+    """
+    def __init__(self, tickers, max_workers=None, **loader_kwargs):
+        self.tickers = list(tickers)
+        self.max_workers = max_workers or max(1, len(self.tickers))
+        self.loader_kwargs = loader_kwargs  # cache_dir, interval, offline, fixture_path, source
+        self.timings = {}
+        self.errors = {}
+        self.wall_time = 0.0
+
+    def _load_one(self, ticker, period):
+        start = time.perf_counter()
+        try:
+            return ticker, DataLoader(ticker, **self.loader_kwargs).fetch_underlying_data(period=period), None
+        except Exception as e:
+            return ticker, None, f"{type(e).__name__}: {e}"
+        finally:
+            self.timings[ticker] = time.perf_counter() - start
+
+    def fetch(self, period="1y", fields=('Close', 'Volatility')):
+        """
+        Returns one date x ticker panel with (field, ticker) columns, outer-joined
+        on dates. Per-ticker timings and failures are kept on the loader.
+        """
+        self.timings, self.errors = {}, {}
+        start = time.perf_counter()
+
+        frames = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for ticker, data, error in pool.map(lambda t: self._load_one(t, period), self.tickers):
+                if error is None:
+                    frames[ticker] = data[list(fields)]
+                else:
+                    self.errors[ticker] = error
+
+        self.wall_time = time.perf_counter() - start
+
+        if not frames:
+            return pd.DataFrame()
+        panel = pd.concat(frames, axis=1, join='outer')
+        return panel.swaplevel(axis=1).sort_index(axis=1, level=0, sort_remaining=False)
+
+
+if __name__ == "__main__":
+    # Offline smoke check against the bundled fixture (no network)
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        loader = DataLoader(cache_dir=cache_dir, offline=True, fixture_path=FIXTURE_DIR)
+        data = loader.fetch_underlying_data(period="3mo")
+        assert not data.empty and data.index.is_monotonic_increasing
+        assert data['Volatility'].notna().all()
+        assert (DataLoader(cache_dir=cache_dir, offline=True).fetch_underlying_data(period="3mo")
+                .equals(data)), "cached read differs from the seeded fixture"
+
+        # Online mode serves a fresh cache without calling the source
+        calls = []
+        source = CSVSource(FIXTURE_DIR)
+        counting = lambda *args, **kwargs: calls.append(kwargs) or source(*args, **kwargs)
+        DataLoader(cache_dir=cache_dir, source=counting).fetch_underlying_data(period="3mo")
+        assert not calls, "fresh cache was refreshed"
+        DataLoader(cache_dir=cache_dir, source=counting, max_age=0).fetch_underlying_data(period="3mo")
+        assert len(calls) == 1, "stale cache was not refreshed"
+
+        # A daily bar cached mid-session is partial: a file written at 11:00
+        # is refreshed at 18:00 the same day, one written after the close is not
+        loader = DataLoader(cache_dir=cache_dir, max_age=0)
+        session = pd.Timestamp('2024-03-13')  # A Wednesday
+        at = lambda clock: pd.Timestamp(f"{session.date()} {clock}", tz=EXCHANGE_TZ)
+        os.utime(loader.cache.path, (at('11:00').timestamp(),) * 2)
+        assert not loader._is_fresh(session, now=at('18:00')), "mid-session daily bar treated as final"
+        os.utime(loader.cache.path, (at('15:45').timestamp(),) * 2)
+        assert loader._is_fresh(session, now=at('18:00')), "post-close daily bar refreshed again"
+
+    print(f"Offline fixture OK: {len(data)} bars {data.index[0].date()} -> {data.index[-1].date()}")
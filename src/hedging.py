@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+
+from src.pricing_engine import price_batch, price_and_greeks_batch
+from src.risk_manager import var_es
+from src.instrumentation import instrument
+
+MIN_HEDGE_T = 1.0 / (365 * 24 * 60)  # One minute: floor for deltas at/after expiry
+
+
+class HedgePolicy:
+    """
+    When to rebalance the futures hedge: the hedge is reviewed every `every`
+    steps (None = never hedge) and traded only when the lots needed to
+    neutralize delta differ from the current hedge by more than `band` lots.
+    band=0 trades on any change of the rounded lot count.
+    """
+    def __init__(self, every=1, band=0.0, name=None):
+        self.every = every
+        self.band = band
+        if name is None:
+            if every is None:
+                name = "Never"
+            else:
+                name = f"Every {every} step{'s' if every != 1 else ''}" + (f", band {band:g} lots" if band else "")
+        self.name = name
+
+
+DEFAULT_POLICIES = (HedgePolicy(1), HedgePolicy(5), HedgePolicy(1, band=1), HedgePolicy(1, band=2))
+
+
+def historical_paths(close, spot, n_steps, vol=None):
+    """
+    Overlapping historical windows rescaled to start at `spot`:
+    path i follows close[i:i + n_steps + 1] / close[i]. Returns (spots, vols);
+    vols are the matching windows of `vol` (annualized), or None.
+    """
+    close = np.asarray(close, dtype=float)
+    windows = np.lib.stride_tricks.sliding_window_view(close, n_steps + 1)
+    spots = spot * windows / windows[:, :1]
+    if vol is None:
+        return spots, None
+    return spots, np.array(np.lib.stride_tricks.sliding_window_view(np.asarray(vol, dtype=float), n_steps + 1))
+
+
+class DeltaHedgeSimulator:
+    """
+    Delta-hedges a PositionBook with index futures along many spot paths at
+    once. Every step reprices the book on all paths in one batched call, then
+    each policy (stacked as an extra array axis) decides where to trade the
+    lot-rounded hedge of -Net_Delta (the RiskManager's Futures_Hedge_Lots).
+    Trades pay the Backtester cost model: brokerage per order plus slippage
+    on traded notional. Futures are marked at spot (no basis or carry).
+    """
+    def __init__(self, lot_size=25, brokerage_per_order=20, slippage_pct=0.001, risk_free_rate=0.07,
+                 close_at_end=True):
+        self.lot_size = lot_size
+        self.brokerage_per_order = brokerage_per_order
+        self.slippage_pct = slippage_pct
+        self.r = risk_free_rate
+        self.close_at_end = close_at_end  # Unwind the hedge (and pay for it) on the last step
+
+    @classmethod
+    def from_backtester(cls, backtester, lot_size=25, **kwargs):
+        return cls(lot_size=lot_size, brokerage_per_order=backtester.brokerage_per_order,
+                   slippage_pct=backtester.slippage_pct, **kwargs)
+
+    @instrument('hedge.simulate')
+    def simulate(self, book, spots, now, vols, step_days=1.0, policies=DEFAULT_POLICIES, confidence=0.95):
+        """
+        spots: (paths, steps + 1) spot paths starting at `now` (days since epoch,
+               the PositionBook clock), one step every step_days days
+        vols:  scalar or (paths, steps + 1) annualized vols used to mark the book
+
+        Returns {'Summary': DataFrame per policy (plus 'Unhedged'), 'PnL': {name:
+        per-path hedged P&L}, 'Unhedged_PnL', 'Lots_Traded', 'Turnover', 'Cost'}. P&L is measured against
+        the book's current marks, so it excludes P&L already booked before `now`.
+        """
+        spots = np.atleast_2d(np.asarray(spots, dtype=float))
+        n_paths, n_points = spots.shape
+        if n_points < 2:
+            raise ValueError("spots needs at least two time columns (the start and one step)")
+        vols = np.broadcast_to(np.maximum(np.asarray(vols, dtype=float), 0.001), spots.shape)
+        step_times = now + np.arange(n_points) * step_days
+
+        strike, is_call = book.Strike, book.Is_Call
+        units = (book.Side * book.Qty)[None, :]
+
+        every = np.array([p.every if p.every is not None else 0 for p in policies])
+        active = np.array([p.every is not None for p in policies])
+        band_units = np.array([p.band for p in policies], dtype=float) * self.lot_size
+        n_policies = len(policies)
+
+        hedge = np.zeros((n_policies, n_paths))      # Futures units held
+        hedge_pnl = np.zeros((n_policies, n_paths))
+        cost = np.zeros((n_policies, n_paths))
+        lots_traded = np.zeros((n_policies, n_paths))
+        turnover = np.zeros((n_policies, n_paths))  # Traded futures notional
+
+        option_start = None
+        for k in range(n_points):
+            S = spots[:, k]
+            if k > 0:
+                hedge_pnl += hedge * (S - spots[:, k - 1])
+
+            T = np.maximum(book.Expiry - step_times[k], 0.0) / 365
+            if k == n_points - 1:
+                option_end = price_batch(S[:, None], strike, T, self.r, vols[:, k, None], is_call) @ units[0]
+                target = np.zeros((n_policies, n_paths)) if self.close_at_end else hedge
+                review = active[:, None] & np.ones((1, n_paths), dtype=bool)
+                self._trade(hedge, target, review, np.zeros(n_policies), S, cost, lots_traded, turnover)
+                break
+
+            greeks = price_and_greeks_batch(S[:, None], strike, np.maximum(T, MIN_HEDGE_T), self.r,
+                                            vols[:, k, None], is_call)
+            if k == 0:
+                option_start = price_batch(S[:, None], strike, T, self.r, vols[:, k, None], is_call) @ units[0]
+            net_delta = greeks['Delta'] @ units[0]
+            target = np.round(-net_delta / self.lot_size) * self.lot_size
+
+            review = (active & (k % np.maximum(every, 1) == 0))[:, None] & np.ones((1, n_paths), dtype=bool)
+            self._trade(hedge, np.broadcast_to(target, hedge.shape), review, band_units, S, cost, lots_traded, turnover)
+
+        option_pnl = option_end - option_start
+        pnl = option_pnl[None, :] + hedge_pnl - cost
+
+        zeros = np.zeros(n_paths)
+        rows = [self._summary('Unhedged', option_pnl, zeros, zeros, zeros, confidence)]
+        rows += [self._summary(p.name, pnl[j], cost[j], lots_traded[j], turnover[j], confidence)
+                 for j, p in enumerate(policies)]
+        return {
+            'Summary': pd.DataFrame(rows).set_index('Policy'),
+            'PnL': {p.name: pnl[j] for j, p in enumerate(policies)},
+            'Unhedged_PnL': option_pnl,
+            'Lots_Traded': {p.name: lots_traded[j] for j, p in enumerate(policies)},
+            'Turnover': {p.name: turnover[j] for j, p in enumerate(policies)},
+            'Cost': {p.name: cost[j] for j, p in enumerate(policies)}
+        }
+
+    def _trade(self, hedge, target, review, band_units, S, cost, lots_traded, turnover):
+        # Moves the reviewed hedges that are outside their band to target, in place
+        trade = target - hedge
+        trade = np.where(review & (np.abs(trade) > band_units[:, None] + 1e-9), trade, 0.0)
+        notional = np.abs(trade) * S
+        cost += np.where(trade != 0, self.brokerage_per_order + self.slippage_pct * notional, 0.0)
+        lots_traded += np.abs(trade) / self.lot_size
+        turnover += notional
+        hedge += trade
+
+    @staticmethod
+    def _summary(name, pnl, cost, lots, turnover, confidence):
+        var, es = var_es(pnl, confidence)
+        return {
+            'Policy': name,
+            'Mean_PnL': float(pnl.mean()),
+            'Std_PnL': float(pnl.std(ddof=1)) if len(pnl) > 1 else 0.0,
+            'VaR': var,
+            'Expected_Shortfall': es,
+            'Mean_Cost': float(cost.mean()),
+            'Mean_Lots_Traded': float(lots.mean()),
+            'Mean_Turnover': float(turnover.mean())
+        }
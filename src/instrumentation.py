@@ -0,0 +1,209 @@
+import cProfile
+import functools
+import io
+import json
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class _State:
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}    # name -> {'Calls', 'Total_s', 'Min_s', 'Max_s', 'Alloc_Bytes'}
+        self.counters = {}  # name -> int (e.g. IV solver iterations)
+        self.profile_text = None
+
+
+_state = _State()
+
+
+# --- SWITCHES ---
+
+def enable():
+    _state.enabled = True
+
+
+def disable():
+    _state.enabled = False
+
+
+def is_enabled():
+    return _state.enabled
+
+
+def reset():
+    _state.stages.clear()
+    _state.counters.clear()
+    _state.profile_text = None
+
+
+# --- HOOKS ---
+
+class _Stage:
+    """
+    Times one execution of a named stage. Net allocated bytes are recorded
+    when tracemalloc is tracing (see capture(memory=True)).
+    """
+    __slots__ = ('name', 'start', 'mem_start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.mem_start = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stats = _state.stages.get(self.name)
+        if stats is None:
+            stats = _state.stages[self.name] = {'Calls': 0, 'Total_s': 0.0, 'Min_s': float('inf'),
+                                                'Max_s': 0.0, 'Alloc_Bytes': 0}
+        stats['Calls'] += 1
+        stats['Total_s'] += elapsed
+        stats['Min_s'] = min(stats['Min_s'], elapsed)
+        stats['Max_s'] = max(stats['Max_s'], elapsed)
+        if self.mem_start is not None and tracemalloc.is_tracing():
+            stats['Alloc_Bytes'] += max(0, tracemalloc.get_traced_memory()[0] - self.mem_start)
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name):
+    """
+    Context manager around a pipeline stage, e.g. `with stage('fetch'): ...`.
+    Returns a shared no-op object while instrumentation is disabled.
+    """
+    return _Stage(name) if _state.enabled else _NULL_STAGE
+
+
+def instrument(name=None):
+    """
+    Decorator recording wall time, calls and allocations of a hot function.
+    Disabled cost is a single flag check per call.
+    """
+    def decorate(fn):
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return fn(*args, **kwargs)
+            with _Stage(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, n=1):
+    """
+    Adds n to a named counter (no-op while disabled).
+    """
+    if _state.enabled:
+        _state.counters[name] = _state.counters.get(name, 0) + n
+
+
+# --- CAPTURE MODE ---
+
+@contextmanager
+def capture(profile=False, memory=False, profile_path=None, top=30):
+    """
+    Opt-in deep capture: enables instrumentation and optionally runs cProfile
+    and tracemalloc for the duration of the block. The cProfile summary (top
+    functions by cumulative time) is kept in report()['Profile'] and, if
+    profile_path is given, the raw stats are dumped there for snakeviz/pstats.
+    """
+    was_enabled = _state.enabled
+    started_tracing = memory and not tracemalloc.is_tracing()
+    profiler = cProfile.Profile() if profile else None
+
+    enable()
+    if started_tracing:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield _state
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            buffer = io.StringIO()
+            pstats.Stats(profiler, stream=buffer).sort_stats('cumulative').print_stats(top)
+            _state.profile_text = buffer.getvalue()
+            if profile_path:
+                profiler.dump_stats(profile_path)
+        if started_tracing:
+            _state.counters['tracemalloc.peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        if not was_enabled:
+            disable()
+
+
+# --- EXPORT ---
+
+def report():
+    stages = {}
+    for name, stats in _state.stages.items():
+        row = dict(stats)
+        row['Mean_s'] = row['Total_s'] / row['Calls'] if row['Calls'] else 0.0
+        stages[name] = row
+    result = {'Stages': stages, 'Counters': dict(_state.counters)}
+    if _state.profile_text:
+        result['Profile'] = _state.profile_text
+    return result
+
+
+def to_json(path=None):
+    text = json.dumps(report(), indent=2)
+    if path:
+        with open(path, 'w') as f:
+            f.write(text)
+    return text
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def to_prometheus(path=None, prefix='nifty'):
+    """
+    Prometheus text exposition format dump of stages and counters.
+    """
+    lines = []
+    metrics = [
+        ('stage_calls_total', 'counter', 'Number of executions per stage', 'Calls'),
+        ('stage_seconds_total', 'counter', 'Total wall time per stage in seconds', 'Total_s'),
+        ('stage_max_seconds', 'gauge', 'Slowest single execution per stage in seconds', 'Max_s'),
+        ('stage_alloc_bytes_total', 'counter', 'Net bytes allocated per stage (tracemalloc)', 'Alloc_Bytes'),
+    ]
+    for metric, kind, help_text, key in metrics:
+        lines.append(f"# HELP {prefix}_{metric} {help_text}")
+        lines.append(f"# TYPE {prefix}_{metric} {kind}")
+        for name, stats in sorted(_state.stages.items()):
+            lines.append(f'{prefix}_{metric}{{stage="{_label(name)}"}} {stats[key]}')
+
+    lines.append(f"# HELP {prefix}_counter_total Named event counters")
+    lines.append(f"# TYPE {prefix}_counter_total counter")
+    for name, value in sorted(_state.counters.items()):
+        lines.append(f'{prefix}_counter_total{{name="{_label(name)}"}} {value}')
+
+    text = "\n".join(lines) + "\n"
+    if path:
+        with open(path, 'w') as f:
+            f.write(text)
+    return text
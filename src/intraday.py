@@ -0,0 +1,187 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.backtester import Backtester, SIGNAL_LEGS
+from src.pricing_engine import price_batch
+from src.strategies import VolatilityStrategy, SIGNAL_SIDES
+from src.position_book import bar_times
+from src.streaming import RollingVolatility
+from src.instrumentation import instrument
+
+BARS_PER_SESSION = 375             # NSE cash session 09:15-15:30 in 1-minute bars
+SESSION_CLOSE = 15.5 / 24          # 15:30 as a fraction of the day (local time)
+PARQUET_SUFFIXES = ('.parquet', '.pq')
+
+
+# --- CHUNKED SOURCES ---
+# Iterables of (DatetimeIndex, close prices) blocks in time order. Timestamps
+# are local exchange wall time; tz-aware stamps are converted to naive local.
+
+def _local_index(stamps):
+    index = pd.DatetimeIndex(pd.to_datetime(stamps))
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index
+
+
+def csv_bar_chunks(path, price_column='Close', time_column=None, chunksize=500000):
+    """
+    Reads only the timestamp (first column by default) and price columns.
+    """
+    if time_column is None:
+        time_column = pd.read_csv(path, nrows=0).columns[0]
+    for chunk in pd.read_csv(path, usecols=[time_column, price_column], chunksize=chunksize):
+        yield _local_index(chunk[time_column]), chunk[price_column].to_numpy(dtype=float)
+
+
+def parquet_bar_chunks(path, price_column='Close', time_column=None, chunksize=500000):
+    """
+    Streams record batches with pyarrow (optional dependency). The timestamp
+    defaults to the stored pandas index, else the first column.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet bars needs pyarrow: pip install pyarrow") from None
+
+    parquet = pq.ParquetFile(path)
+    if time_column is None:
+        index_columns = (parquet.schema_arrow.pandas_metadata or {}).get('index_columns', [])
+        named = [c for c in index_columns if isinstance(c, str)]
+        time_column = named[0] if named else parquet.schema_arrow.names[0]
+    for batch in parquet.iter_batches(batch_size=chunksize, columns=[time_column, price_column]):
+        yield (_local_index(batch.column(time_column).to_pandas()),
+               batch.column(price_column).to_numpy(zero_copy_only=False).astype(float))
+
+
+def bar_chunks(path, price_column='Close', time_column=None, chunksize=500000):
+    if str(path).lower().endswith(PARQUET_SUFFIXES):
+        return parquet_bar_chunks(path, price_column, time_column, chunksize)
+    return csv_bar_chunks(path, price_column, time_column, chunksize)
+
+
+class IntradayBacktester(Backtester):
+    """
+    Minute-bar backtest streamed from chunked files. Each block of bars goes
+    through the columnar engine (vectorized pricing and signals, event loop
+    with the position carried across blocks), so memory depends on the chunk
+    size, not the history length: per-bar equity is only summarized (and
+    optionally appended to a CSV), and session closes are kept.
+
+    Intraday specifics:
+    - Volatility is a rolling window of bar returns annualized with
+      252 * bars_per_session; overnight gaps are left out unless
+      overnight_returns=True.
+    - Options expire at session_close, entry_tenor_days calendar days after
+      the entry day, and are marked at their fractional-day time to expiry.
+    - square_off=True closes everything on each session's last bar and takes
+      no entries there.
+    """
+    def __init__(self, bars_per_session=BARS_PER_SESSION, vol_window=BARS_PER_SESSION, session_close=SESSION_CLOSE,
+                 square_off=True, overnight_returns=False, entry_tenor_days=7, **kwargs):
+        super().__init__(entry_tenor_days=entry_tenor_days, **kwargs)
+        self.bars_per_session = bars_per_session
+        self.vol_window = vol_window
+        self.session_close = session_close
+        self.square_off = square_off
+        self.overnight_returns = overnight_returns
+        self.summary = {}
+
+    def run_file(self, path, price_column='Close', time_column=None, chunksize=500000, equity_output=None):
+        return self.run_stream(bar_chunks(path, price_column, time_column, chunksize), equity_output)
+
+    @instrument('backtest.intraday')
+    def run_stream(self, chunks, equity_output=None):
+        """
+        Runs over an iterable of (DatetimeIndex, close) blocks. Returns the
+        equity at every session close; self.summary holds ROI, max drawdown
+        and throughput over all bars. equity_output appends per-bar equity.
+        """
+        print(f"Starting Intraday Backtest with ₹{self.capital:,.2f}...")
+        start = time.perf_counter()
+        self._vol = RollingVolatility(self.vol_window, 252 * self.bars_per_session)
+        self._strategy = VolatilityStrategy(volatility_threshold=self.volatility_threshold)
+        self._last_day = None
+        self._peak = float(self.capital)
+        self._max_drawdown = 0.0
+        self._bars = 0
+        self._sessions = []
+        if equity_output is not None and os.path.exists(equity_output):
+            os.remove(equity_output)
+
+        # Each block's last bar is held back until the next block shows
+        # whether it closes its session
+        pending = None
+        for index, close in chunks:
+            if pending is not None:
+                index = pending[0].append(index)
+                close = np.concatenate((pending[1], close))
+            if len(index) == 0:
+                continue
+            days = np.floor(bar_times(index))
+            session_end = days[1:] != days[:-1]
+            self._run_block(index[:-1], close[:-1], days[:-1], session_end, equity_output)
+            pending = (index[-1:], close[-1:])
+        if pending is not None:
+            self._run_block(pending[0], pending[1], np.floor(bar_times(pending[0])), np.ones(1, dtype=bool),
+                            equity_output)
+
+        elapsed = time.perf_counter() - start
+        equity_df = pd.DataFrame(self._sessions, columns=['Date', 'Equity'])
+        final = equity_df['Equity'].iloc[-1] if len(equity_df) else float(self.capital)
+        self.summary = {
+            'Bars': self._bars,
+            'Sessions': len(equity_df),
+            'ROI': float((final - self.capital) / self.capital * 100),
+            'Max_Drawdown': self._max_drawdown * 100,
+            'Trades': len(self.transaction_log),
+            'Bars_Per_Second': self._bars / elapsed if elapsed > 0 else float('inf')
+        }
+        return equity_df
+
+    def _run_block(self, index, spots, days, session_end, equity_output):
+        n = len(spots)
+        if n == 0:
+            return
+        times = bar_times(index)
+
+        # 1. Stateless precomputation for the block
+        session_start = days != np.concatenate(([self._last_day if self._last_day is not None else days[0]], days[:-1]))
+        self._last_day = days[-1]
+        vols = self._vol.update_batch(spots, keep=None if self.overnight_returns else ~session_start)
+
+        expiries = days + self.entry_tenor_days + self.session_close
+        T = np.maximum(expiries - times, 0.0) / 365
+        atm_strikes = np.round(spots / 50) * 50
+        call_prices = price_batch(spots, atm_strikes, T, 0.07, vols, 'call')
+        put_prices = price_batch(spots, atm_strikes, T, 0.07, vols, 'put')
+        # NaN vols (window still filling) never signal
+        codes = self._strategy.classify_signals(np.nan, vols, atm_strikes, spots)
+        sides = SIGNAL_SIDES[codes]
+        force_exit = None
+        if self.square_off:
+            force_exit = session_end
+            sides = np.where(session_end, 0, sides)
+
+        def enter(i):
+            prices = [float(call_prices[i]) if is_call else float(put_prices[i]) for is_call in SIGNAL_LEGS[codes[i]]]
+            self._execute_trade(int(codes[i]), int(atm_strikes[i]), prices, index[i], times[i], expiry=expiries[i])
+
+        # 2. Stateful pass; open positions carry into the next block
+        if self.max_positions != 1:
+            equity = self._run_columnar_stacked(spots, vols, times, sides, enter, force_exit)
+        else:
+            equity = self._run_events(spots, vols, times, sides, enter, force_exit)
+
+        # 3. Bounded-memory bookkeeping
+        peak = np.maximum(np.maximum.accumulate(equity), self._peak)
+        self._max_drawdown = min(self._max_drawdown, float(np.min(equity / peak - 1)))
+        self._peak = float(peak[-1])
+        self._bars += n
+        self._sessions.extend(zip(index[session_end], equity[session_end]))
+        if equity_output is not None:
+            pd.DataFrame({'Date': index, 'Equity': equity}).to_csv(
+                equity_output, mode='a', header=not os.path.exists(equity_output), index=False)
@@ -0,0 +1,280 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.pricing_engine import price_batch
+from src.risk_manager import var_es
+from src.instrumentation import instrument, count
+
+# Exit reasons reported per path by MonteCarloEngine.pnl_distribution
+EXIT_HORIZON = 0
+EXIT_TARGET = 1
+EXIT_STOP = 2
+EXIT_EXPIRY = 3
+
+
+class StochasticVol:
+    """
+    Heston variance dynamics: dv = kappa (theta - v) dt + vol_of_vol sqrt(v) dW2,
+    corr(dW1, dW2) = rho. theta defaults to the starting variance.
+    """
+    def __init__(self, kappa=2.0, theta=None, vol_of_vol=0.5, rho=-0.7):
+        self.kappa = kappa
+        self.theta = theta
+        self.vol_of_vol = vol_of_vol
+        self.rho = rho
+
+
+# --- PAYOFFS ---
+# Undiscounted payoff per path from a (paths, steps + 1) spot array whose first
+# column is the starting spot. The terminal vanilla payoff is the control variate.
+
+class EuropeanOption:
+    def __init__(self, strike, is_call=True):
+        self.strike = strike
+        self.is_call = is_call
+
+    def vanilla(self, terminal):
+        if self.is_call:
+            return np.maximum(terminal - self.strike, 0.0)
+        return np.maximum(self.strike - terminal, 0.0)
+
+    def payoff(self, paths):
+        return self.vanilla(paths[:, -1])
+
+
+class AsianOption(EuropeanOption):
+    """
+    Arithmetic-average settlement over the monitoring steps (excluding today).
+    """
+    def payoff(self, paths):
+        return self.vanilla(paths[:, 1:].mean(axis=1))
+
+
+class BarrierOption(EuropeanOption):
+    """
+    Discretely monitored knock-out ('out') or knock-in ('in') vanilla. The
+    barrier is a down barrier when it sits below the starting spot, else up.
+    """
+    def __init__(self, strike, barrier, is_call=True, knock='out', rebate=0.0):
+        super().__init__(strike, is_call)
+        self.barrier = barrier
+        self.knock = knock
+        self.rebate = rebate
+
+    def payoff(self, paths):
+        if self.barrier < paths[0, 0]:
+            touched = paths[:, 1:].min(axis=1) <= self.barrier
+        else:
+            touched = paths[:, 1:].max(axis=1) >= self.barrier
+        alive = ~touched if self.knock == 'out' else touched
+        return np.where(alive, self.vanilla(paths[:, -1]), self.rebate)
+
+
+# --- PATH GENERATION ---
+
+def simulate_paths(S, T, r, sigma, n_paths, n_steps, rng, antithetic=True, stochastic_vol=None):
+    """
+    Spot paths of shape (n_paths, n_steps + 1) under GBM (exact log-normal
+    steps) or Heston (full-truncation Euler). With antithetic=True the second
+    half of the paths reuses the negated shocks of the first half.
+    Returns (spots, vols); vols is the per-step instantaneous vol for Heston,
+    None for GBM.
+    """
+    dt = T / n_steps
+    half = (n_paths + 1) // 2 if antithetic else n_paths
+
+    def shocks():
+        z = rng.standard_normal((half, n_steps))
+        return np.concatenate([z, -z])[:n_paths] if antithetic else z
+
+    log_spot = np.empty((n_paths, n_steps + 1))
+    log_spot[:, 0] = np.log(S)
+
+    if stochastic_vol is None:
+        increments = (r - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * shocks()
+        np.cumsum(increments, axis=1, out=log_spot[:, 1:])
+        log_spot[:, 1:] += log_spot[:, :1]
+        return np.exp(log_spot), None
+
+    sv = stochastic_vol
+    theta = sigma ** 2 if sv.theta is None else sv.theta
+    z1, w = shocks(), shocks()
+    z2 = sv.rho * z1 + np.sqrt(1 - sv.rho ** 2) * w
+    variance = np.full(n_paths, sigma ** 2)
+    vols = np.empty((n_paths, n_steps + 1))
+    vols[:, 0] = sigma
+    for k in range(n_steps):
+        v = np.maximum(variance, 0.0)
+        log_spot[:, k + 1] = log_spot[:, k] + (r - 0.5 * v) * dt + np.sqrt(v * dt) * z1[:, k]
+        variance = variance + sv.kappa * (theta - v) * dt + sv.vol_of_vol * np.sqrt(v * dt) * z2[:, k]
+        vols[:, k + 1] = np.sqrt(np.maximum(variance, 0.0))
+    return np.exp(log_spot), vols
+
+
+def _pair_average(values, antithetic):
+    # Antithetic pairs are averaged so the samples used for the error are iid
+    if not antithetic or len(values) < 2:
+        return values
+    half = len(values) // 2
+    return 0.5 * (values[:half] + values[half:2 * half])
+
+
+# --- CHUNK WORKERS ---
+# Module-level so they can run in a process pool; each gets its own seed.
+
+def _price_chunk(task):
+    payoff, S, T, r, sigma, n_paths, n_steps, seed, antithetic, stochastic_vol = task
+    rng = np.random.default_rng(seed)
+    paths, _ = simulate_paths(S, T, r, sigma, n_paths, n_steps, rng, antithetic, stochastic_vol)
+    discount = np.exp(-r * T)
+    y = _pair_average(discount * payoff.payoff(paths), antithetic)
+    x = _pair_average(discount * payoff.vanilla(paths[:, -1]), antithetic)
+    # Sufficient statistics: chunks from any worker merge by addition
+    return np.array([len(y), y.sum(), y @ y, x.sum(), x @ x, x @ y])
+
+
+def _pnl_chunk(task):
+    (legs, spot, vol, now, r, horizon_days, n_steps, profit_target, stop_loss,
+     n_paths, seed, antithetic, stochastic_vol) = task
+    rng = np.random.default_rng(seed)
+    paths, path_vols = simulate_paths(spot, horizon_days / 365, r, vol, n_paths, n_steps, rng,
+                                      antithetic, stochastic_vol)
+    step_times = now + np.arange(1, n_steps + 1) * horizon_days / n_steps
+
+    # (paths, steps, legs) marks at every leg's remaining time to expiry
+    T = np.maximum(legs['Expiry'][None, :] - step_times[:, None], 0.0) / 365
+    mark_vol = vol if path_vols is None else path_vols[:, 1:, None]
+    marks = price_batch(paths[:, 1:, None], legs['Strike'], T[None, :, :], r, mark_vol, legs['Is_Call'])
+    pnl = (legs['Side'] * (marks - legs['Entry_Price']) * legs['Qty']).sum(axis=2)
+
+    reason = np.where(pnl > profit_target, EXIT_TARGET, np.where(pnl < stop_loss, EXIT_STOP, EXIT_HORIZON))
+    expired = step_times >= legs['Expiry'].min()
+    reason[:, expired] = np.where(reason[:, expired] == EXIT_HORIZON, EXIT_EXPIRY, reason[:, expired])
+    exited = reason != EXIT_HORIZON
+    exit_step = np.where(exited.any(axis=1), exited.argmax(axis=1), n_steps - 1)
+    rows = np.arange(n_paths)
+    return pnl[rows, exit_step], exit_step + 1, reason[rows, exit_step]
+
+
+class MonteCarloEngine:
+    """
+    Vectorized Monte Carlo valuation for path-dependent payoffs and exit-rule
+    P&L distributions.
+
+    Paths are NumPy arrays generated in chunks of at most chunk_size paths to
+    bound memory. Every chunk draws from its own child of SeedSequence(seed),
+    so results are reproducible and identical for any max_workers; with
+    max_workers > 1 chunks run on a process pool. Variance reduction:
+    antithetic shocks and, under GBM, the Black-Scholes closed form of the
+    terminal vanilla as a control variate (optimal beta estimated from the run).
+    """
+    def __init__(self, n_paths=100000, n_steps=50, chunk_size=25000, antithetic=True,
+                 control_variate=True, stochastic_vol=None, risk_free_rate=0.07, seed=None, max_workers=1):
+        self.n_paths = n_paths
+        self.n_steps = n_steps
+        self.chunk_size = chunk_size
+        self.antithetic = antithetic
+        self.control_variate = control_variate
+        self.stochastic_vol = stochastic_vol
+        self.r = risk_free_rate
+        self.seed = seed
+        self.max_workers = max_workers
+
+    def _chunks(self, n_paths):
+        sizes = [min(self.chunk_size, n_paths - start) for start in range(0, n_paths, self.chunk_size)]
+        if self.antithetic:
+            sizes = [size + size % 2 for size in sizes]  # Whole antithetic pairs per chunk
+        seeds = np.random.SeedSequence(self.seed).spawn(len(sizes))
+        return sizes, seeds
+
+    def _map(self, fn, tasks):
+        if self.max_workers == 1 or len(tasks) == 1:
+            return [fn(task) for task in tasks]
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(fn, tasks))
+
+    @instrument('mc.price')
+    def price(self, payoff, S, T, sigma, n_paths=None, n_steps=None):
+        """
+        Discounted expected payoff. Returns Price, Std_Error, Paths and the
+        control variate Beta (0.0 when not used). A European payoff with the
+        control variate reproduces the closed form exactly (zero error).
+        """
+        n_paths = n_paths or self.n_paths
+        n_steps = n_steps or self.n_steps
+        sizes, seeds = self._chunks(n_paths)
+        tasks = [(payoff, S, T, self.r, sigma, size, n_steps, seed, self.antithetic, self.stochastic_vol)
+                 for size, seed in zip(sizes, seeds)]
+        n, sy, syy, sx, sxx, sxy = np.sum(self._map(_price_chunk, tasks), axis=0)
+        count('mc.paths', sum(sizes))
+
+        mean_y = sy / n
+        var_y = max(syy - n * mean_y ** 2, 0.0) / max(n - 1, 1)
+        beta = 0.0
+        price = mean_y
+
+        # The BS control is only unbiased when paths are GBM
+        if self.control_variate and self.stochastic_vol is None:
+            mean_x = sx / n
+            var_x = max(sxx - n * mean_x ** 2, 0.0) / max(n - 1, 1)
+            cov_xy = (sxy - n * mean_x * mean_y) / max(n - 1, 1)
+            if var_x > 0:
+                beta = cov_xy / var_x
+                control = price_batch(S, payoff.strike, T, self.r, sigma, payoff.is_call)
+                price = mean_y - beta * (mean_x - float(control))
+                var_y = max(var_y - 2 * beta * cov_xy + beta ** 2 * var_x, 0.0)
+
+        return {
+            'Price': float(price),
+            'Std_Error': float(np.sqrt(var_y / n)),
+            'Paths': sum(sizes),
+            'Beta': float(beta)
+        }
+
+    @instrument('mc.pnl_distribution')
+    def pnl_distribution(self, book, spot, vol, now, profit_target, stop_loss, horizon_days=None,
+                         n_paths=None, steps_per_day=1, confidence=0.95):
+        """
+        P&L distribution of an open PositionBook under the Backtester's exit
+        rules: each path is marked every step (real time to expiry, at the
+        path's vol under Heston) and exits at the first step where the book's
+        P&L is above profit_target or below stop_loss, or when the first leg
+        expires (settled at intrinsic value). Paths still open after
+        horizon_days (default: days to the first expiry) are marked there.
+        Returns summary statistics plus per-path PnL, Exit_Day and Exit_Reason.
+        """
+        n_paths = n_paths or self.n_paths
+        legs = {name: np.array(getattr(book, name)) for name in
+                ('Is_Call', 'Side', 'Strike', 'Expiry', 'Qty', 'Entry_Price')}
+        if len(book) == 0:
+            raise ValueError("Position book is empty")
+        if horizon_days is None:
+            horizon_days = max(float(legs['Expiry'].min() - now), 1.0)
+        n_steps = max(1, int(np.ceil(horizon_days * steps_per_day)))
+
+        sizes, seeds = self._chunks(n_paths)
+        tasks = [(legs, spot, vol, now, self.r, horizon_days, n_steps, profit_target, stop_loss,
+                  size, seed, self.antithetic, self.stochastic_vol) for size, seed in zip(sizes, seeds)]
+        results = self._map(_pnl_chunk, tasks)
+        count('mc.paths', sum(sizes))
+
+        pnl = np.concatenate([res[0] for res in results])
+        exit_day = np.concatenate([res[1] for res in results]) * horizon_days / n_steps
+        reason = np.concatenate([res[2] for res in results])
+
+        var, es = var_es(pnl, confidence)
+        return {
+            'Mean': float(pnl.mean()),
+            'Std': float(pnl.std(ddof=1)),
+            'Std_Error': float(pnl.std(ddof=1) / np.sqrt(len(pnl))),
+            'VaR': var,
+            'Expected_Shortfall': es,
+            'P_Target': float(np.mean(reason == EXIT_TARGET)),
+            'P_Stop': float(np.mean(reason == EXIT_STOP)),
+            'P_Expiry': float(np.mean(reason == EXIT_EXPIRY)),
+            'Mean_Exit_Day': float(exit_day.mean()),
+            'PnL': pnl,
+            'Exit_Day': exit_day,
+            'Exit_Reason': reason
+        }
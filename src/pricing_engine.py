@@ -1,5 +1,20 @@
+import math
+import threading
+from collections import OrderedDict
 import numpy as np
-from scipy.stats import norm
+from scipy.special import ndtr
+from src.instrumentation import instrument, count
+
+
+class _LazyNorm:
+    # scipy.stats takes ~1s to import; only the scalar BlackScholes class needs it
+    def __getattr__(self, name):
+        from scipy.stats import norm as scipy_norm
+        return getattr(scipy_norm, name)
+
+
+norm = _LazyNorm()
+
 
 class BlackScholes:
     def __init__(self, S, K, T, r, sigma, type='call'):
@@ -66,44 +81,376 @@ class BlackScholes:
         else:
             return -self.K * self.T * np.exp(-self.r * self.T) * norm.cdf(-d2) / 100
         
+    def calculate_all(self, validate=False):
+        """
+        Price and all Greeks from a single evaluation of the fast scalar kernel.
+        With validate=True the result is also checked against the scipy-based
+        methods above and a RuntimeError is raised if any value differs by more
+        than FAST_KERNEL_TOLERANCE (relative, with the same absolute floor).
+        """
+        result = price_and_greeks_scalar(self.S, self.K, self.T, self.r, self.sigma, self.type == 'call')
+
+        if validate:
+            reference = {
+                'Price': self.calculate_price(),
+                'Delta': self.calculate_delta(),
+                'Gamma': self.calculate_gamma(),
+                'Vega': self.calculate_vega(),
+                'Theta': self.calculate_theta(),
+                'Rho': self.calculate_rho()
+            }
+            for name, expected in reference.items():
+                if abs(result[name] - expected) > FAST_KERNEL_TOLERANCE * max(1.0, abs(expected)):
+                    raise RuntimeError(f"Fast kernel mismatch on {name}: {result[name]} vs {expected}")
+
+        return result
+
     def calculate_implied_volatility(self, market_price):
         """
-        Calculates Implied Volatility (IV) using Newton-Raphson.
-        Includes safeguards against Arbitrage Violations and Negative Volatility.
+        Calculates Implied Volatility (IV) for this contract.
+        Delegates to the batched Newton/bisection solver, so calls and puts are
+        both checked against their own no-arbitrage bounds. Returns 0.0 on an
+        arbitrage violation. Does not modify self.sigma.
         """
-        MAX_ITERATIONS = 100
-        PRECISION = 1.0e-5
-        
-        # 1. Arbitrage Check: Price must be > Intrinsic Value
-        intrinsic_value = max(0, self.S - self.K)
-        if market_price <= intrinsic_value:
-            return 0.0 
-            
-        # Start with a guess
-        sigma = 0.5
-        
-        for i in range(MAX_ITERATIONS):
-            self.sigma = sigma
-            price = self.calculate_price()
-            vega = self.calculate_vega() * 100 
-            
-            diff = market_price - price
-            
-            if abs(diff) < PRECISION:
-                return sigma
-            
-            if abs(vega) < 1e-8:
-                return sigma 
-            
-            # Newton Step
-            step = diff / vega
-            sigma = sigma + step
-            
-            # --- SAFETY CHECK: Prevent negative volatility ---
-            if sigma <= 0:
-                sigma = 0.001 # Reset to a small positive number if it goes negative
-            
-        return sigma
+        iv, _ = implied_volatility_batch(market_price, self.S, self.K, self.T, self.r, self.type)
+        return float(iv)
+
+# --- FAST SCALAR KERNEL ---
+# Pure-math normal CDF/PDF: avoids the scipy.stats dispatch overhead, which
+# dominates the cost of pricing a single contract. Agrees with the scipy path
+# to within FAST_KERNEL_TOLERANCE (erfc keeps full precision in the tails).
+
+FAST_KERNEL_TOLERANCE = 1.0e-9
+
+_SQRT_2 = math.sqrt(2.0)
+_INV_SQRT_2PI = 1.0 / math.sqrt(2.0 * math.pi)
+
+
+def _norm_cdf(x):
+    return 0.5 * math.erfc(-x / _SQRT_2)
+
+
+def price_scalar(S, K, T, r, sigma, is_call=True):
+    """
+    Price only, for hot single-contract paths (e.g. mark-to-market).
+    """
+    sqrt_T = math.sqrt(T)
+    d1 = (math.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * sqrt_T)
+    d2 = d1 - sigma * sqrt_T
+    discount = K * math.exp(-r * T)
+    if is_call:
+        return S * _norm_cdf(d1) - discount * _norm_cdf(d2)
+    return discount * _norm_cdf(-d2) - S * _norm_cdf(-d1)
+
+
+def price_and_greeks_scalar(S, K, T, r, sigma, is_call=True):
+    """
+    Price and all Greeks for one contract from a single d1/d2 evaluation.
+    Same units as the BlackScholes methods (Vega/Rho per 1%, Theta per day).
+    """
+    sqrt_T = math.sqrt(T)
+    d1 = (math.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * sqrt_T)
+    d2 = d1 - sigma * sqrt_T
+    discount = K * math.exp(-r * T)
+    pdf_d1 = math.exp(-0.5 * d1 * d1) * _INV_SQRT_2PI
+    cdf_d1 = _norm_cdf(d1)
+    term1 = -(S * pdf_d1 * sigma) / (2 * sqrt_T)
+
+    if is_call:
+        cdf_d2 = _norm_cdf(d2)
+        price = S * cdf_d1 - discount * cdf_d2
+        delta = cdf_d1
+        theta = term1 - r * discount * cdf_d2
+        rho = T * discount * cdf_d2
+    else:
+        cdf_neg_d2 = _norm_cdf(-d2)
+        price = discount * cdf_neg_d2 - S * _norm_cdf(-d1)
+        delta = cdf_d1 - 1
+        theta = term1 + r * discount * cdf_neg_d2
+        rho = -T * discount * cdf_neg_d2
+
+    return {
+        'Price': price,
+        'Delta': delta,
+        'Gamma': pdf_d1 / (S * sigma * sqrt_T),
+        'Vega': S * pdf_d1 * sqrt_T / 100,
+        'Theta': theta / 365,
+        'Rho': rho / 100
+    }
+
+
+# --- MEMOIZING CACHE ---
+
+class PricingCache:
+    """
+    Bounded LRU cache of fast-kernel results keyed on quantized inputs.
+    Inputs are snapped to a grid (spot/strike tick, vol, time, rate) and the
+    price is evaluated at the snapped values, so a key always maps to the same
+    answer regardless of which caller populated it.
+    Returned dicts are shared with the cache: treat them as read-only.
+    Thread-safe, so one instance can serve concurrent Streamlit sessions.
+
+    Only scalar call sites use it: the loop backtest engine (Backtester's
+    pricing_cache). The columnar engine, sweeps and the dashboard price whole
+    arrays in one batched call, which is cheaper than per-tuple lookups.
+    """
+    def __init__(self, maxsize=4096, price_tick=0.05, vol_tick=1.0e-5, time_tick=1.0e-6, rate_tick=1.0e-6):
+        self.maxsize = maxsize
+        self.price_tick = price_tick  # NSE tick size for spot/strike
+        self.vol_tick = vol_tick
+        self.time_tick = time_tick    # ~30 seconds expressed in years
+        self.rate_tick = rate_tick
+        self._store = OrderedDict()
+        self._lock = threading.Lock()  # Guards _store and the counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, S, K, T, r, sigma, is_call):
+        return (round(S / self.price_tick), round(K / self.price_tick), round(T / self.time_tick),
+                round(r / self.rate_tick), round(sigma / self.vol_tick), is_call)
+
+    def price_and_greeks(self, S, K, T, r, sigma, type='call'):
+        is_call = type.lower() == 'call' if isinstance(type, str) else bool(type)
+        key = self._key(S, K, T, r, sigma, is_call)
+
+        with self._lock:
+            result = self._store.get(key)
+            if result is not None:
+                self.hits += 1
+                self._store.move_to_end(key)
+                return result
+            self.misses += 1
+
+        # Evaluated outside the lock; a concurrent miss on the same key stores the same result
+        result = price_and_greeks_scalar(key[0] * self.price_tick, key[1] * self.price_tick,
+                                         key[2] * self.time_tick, key[3] * self.rate_tick,
+                                         key[4] * self.vol_tick, is_call)
+        with self._lock:
+            self._store[key] = result
+            self._store.move_to_end(key)
+            if len(self._store) > self.maxsize:
+                self._store.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def price(self, S, K, T, r, sigma, type='call'):
+        return self.price_and_greeks(S, K, T, r, sigma, type)['Price']
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'Hits': self.hits,
+                'Misses': self.misses,
+                'Evictions': self.evictions,
+                'Size': len(self._store),
+                'Max_Size': self.maxsize,
+                'Hit_Rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __getstate__(self):
+        # Locks do not pickle (e.g. a Backtester sent to a sweep worker)
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+# --- VECTORIZED (BATCH) PRICING ---
+
+def _is_call_mask(type):
+    """
+    Normalises option type input into a boolean 'is call' array.
+    Accepts 'call'/'put' (any case), an array of such strings, or a boolean array.
+    """
+    arr = np.asarray(type)
+    if arr.dtype == bool:
+        return arr
+    return np.char.lower(arr.astype(str)) == 'call'
+
+
+@instrument('pricing.batch')
+def price_and_greeks_batch(S, K, T, r, sigma, type='call'):
+    """
+    Prices a whole chain (or any batch of contracts) in one vectorized pass.
+    All inputs broadcast against each other like NumPy arrays.
+
+    d1/d2, the normal PDF and the CDFs are computed once and shared by the
+    price and every Greek. Units match the scalar BlackScholes methods:
+    Vega and Rho per 1% move, Theta per calendar day.
+
+    Returns a dict of arrays: Price, Delta, Gamma, Vega, Theta, Rho.
+    """
+    S, K, T, r, sigma = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (S, K, T, r, sigma)))
+    is_call = np.broadcast_to(_is_call_mask(type), S.shape)
+
+    sqrt_T = np.sqrt(T)
+    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * sqrt_T)
+    d2 = d1 - sigma * sqrt_T
+
+    pdf_d1 = np.exp(-0.5 * d1 ** 2) / np.sqrt(2 * np.pi)
+    cdf_d1 = ndtr(d1)
+    cdf_d2 = ndtr(d2)
+    cdf_neg_d2 = ndtr(-d2)
+    discount = K * np.exp(-r * T)
+
+    price = np.where(is_call,
+                     S * cdf_d1 - discount * cdf_d2,
+                     discount * cdf_neg_d2 - S * ndtr(-d1))
+    delta = np.where(is_call, cdf_d1, cdf_d1 - 1)
+    gamma = pdf_d1 / (S * sigma * sqrt_T)
+    vega = S * pdf_d1 * sqrt_T / 100
+
+    term1 = -(S * pdf_d1 * sigma) / (2 * sqrt_T)
+    theta = np.where(is_call,
+                     term1 - r * discount * cdf_d2,
+                     term1 + r * discount * cdf_neg_d2) / 365
+    rho = np.where(is_call, T * discount * cdf_d2, -T * discount * cdf_neg_d2) / 100
+
+    return {
+        'Price': price,
+        'Delta': delta,
+        'Gamma': gamma,
+        'Vega': vega,
+        'Theta': theta,
+        'Rho': rho
+    }
+
+
+@instrument('pricing.price_batch')
+def price_batch(S, K, T, r, sigma, type='call'):
+    """
+    Price-only version of price_and_greeks_batch for revaluation loops
+    (scenarios, surfaces, paths). Expired contracts (T <= 0) are valued at
+    intrinsic value instead of producing NaNs.
+    """
+    S, K, T, r, sigma = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (S, K, T, r, sigma)))
+    is_call = _is_call_mask(type)
+
+    live = T > 0
+    T_live = np.where(live, T, 1.0)
+    sqrt_T = np.sqrt(T_live)
+    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T_live) / (sigma * sqrt_T)
+    d2 = d1 - sigma * sqrt_T
+    discount = K * np.exp(-r * T_live)
+
+    # Puts via put-call parity: halves the CDF evaluations
+    call = S * ndtr(d1) - discount * ndtr(d2)
+    price = np.where(is_call, call, call - S + discount)
+    if live.all():
+        return price
+    intrinsic = np.where(is_call, np.maximum(S - K, 0), np.maximum(K - S, 0))
+    return np.where(live, price, intrinsic)
+
+
+# --- VECTORIZED IMPLIED VOLATILITY ---
+
+# Per-element solver status codes returned by implied_volatility_batch
+IV_CONVERGED = 0
+IV_ARBITRAGE = 1       # Price outside no-arbitrage bounds (IV reported as 0.0)
+IV_NOT_CONVERGED = 2   # Hit max iterations / price above the upper vol bracket
+
+
+def _price_vega(S, K, T, r, sigma, is_call):
+    # Minimal kernel for the IV solver: price and raw vega (per 1.0 vol, not per 1%)
+    sqrt_T = np.sqrt(T)
+    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * sqrt_T)
+    d2 = d1 - sigma * sqrt_T
+    discount = K * np.exp(-r * T)
+    price = np.where(is_call,
+                     S * ndtr(d1) - discount * ndtr(d2),
+                     discount * ndtr(-d2) - S * ndtr(-d1))
+    vega = S * np.exp(-0.5 * d1 ** 2) / np.sqrt(2 * np.pi) * sqrt_T
+    return price, vega
+
+
+@instrument('iv.solve')
+def implied_volatility_batch(market_price, S, K, T, r, type='call',
+                             tol=1.0e-5, max_iter=100, sigma_low=1.0e-4, sigma_high=5.0):
+    """
+    Solves Implied Volatility for a whole vector of quotes at once.
+
+    Each iteration takes a vectorized Newton-Raphson step and keeps a
+    [low, high] bracket around the root. When the Newton step leaves the
+    bracket (flat vega in the deep OTM/ITM wings) the element falls back to
+    bisection, so no strike can stall or diverge. Converged elements are
+    masked out and not repriced.
+
+    Returns (iv, status) arrays; status holds IV_CONVERGED / IV_ARBITRAGE /
+    IV_NOT_CONVERGED per element.
+    """
+    market_price, S, K, T, r = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (market_price, S, K, T, r)))
+    is_call = np.broadcast_to(_is_call_mask(type), S.shape)
+    shape = S.shape
+
+    market_price, S, K, T, r = (x.ravel() for x in (market_price, S, K, T, r))
+    is_call = is_call.ravel()
+
+    iv = np.zeros(market_price.size)
+    status = np.full(market_price.size, IV_NOT_CONVERGED, dtype=np.int8)
+
+    # 1. Arbitrage Check: Price must lie between intrinsic value and the asset/strike bound
+    discount = K * np.exp(-r * T)
+    lower_bound = np.where(is_call, np.maximum(S - discount, 0), np.maximum(discount - S, 0))
+    upper_bound = np.where(is_call, S, discount)
+    arbitrage = (market_price <= lower_bound) | (market_price >= upper_bound) | ~(T > 0)
+    status[arbitrage] = IV_ARBITRAGE
+
+    active = np.flatnonzero(~arbitrage)
+    low = np.full(active.size, sigma_low)
+    high = np.full(active.size, sigma_high)
+    sigma = np.full(active.size, 0.5)
+    best = sigma.copy()                      # Iterate with the smallest |price error| so far
+    best_error = np.full(active.size, np.inf)
+
+    iterations = 0
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        iterations += 1
+
+        price, vega = _price_vega(S[active], K[active], T[active], r[active], sigma, is_call[active])
+        diff = price - market_price[active]
+        error = np.abs(diff)
+        improved = error < best_error
+        best = np.where(improved, sigma, best)
+        best_error = np.where(improved, error, best_error)
+
+        done = error < tol
+        iv[active[done]] = sigma[done]
+        status[active[done]] = IV_CONVERGED
+
+        # Price is increasing in vol: shrink the bracket towards the root
+        high = np.where(diff > 0, sigma, high)
+        low = np.where(diff < 0, sigma, low)
+
+        # Newton Step, falling back to bisection when it leaves the bracket
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = sigma - diff / vega
+        bisect = ~((newton > low) & (newton < high))
+        sigma = np.where(bisect, 0.5 * (low + high), newton)
+
+        keep = ~done
+        active, low, high, sigma = active[keep], low[keep], high[keep], sigma[keep]
+        best, best_error = best[keep], best_error[keep]
+
+    # Unconverged elements report their closest iterate
+    iv[active] = best
+    count('iv.iterations', iterations)
+    count('iv.quotes', market_price.size)
+
+    return iv.reshape(shape), status.reshape(shape)
+
 
 if __name__ == "__main__":
     # Test Case: Nifty ATM Option
@@ -116,4 +463,10 @@ if __name__ == "__main__":
     print(f"Delta: {bs.calculate_delta():.4f} (Speed)")
     print(f"Gamma: {bs.calculate_gamma():.4f} (Acceleration)")
     print(f"Vega:  {bs.calculate_vega():.4f} (Exposure to 1% Vol change)")
-    print(f"Theta: {bs.calculate_theta():.4f} (Daily Time Decay)")
\ No newline at end of file
+    print(f"Theta: {bs.calculate_theta():.4f} (Daily Time Decay)")
+
+    # Batch Case: Whole chain in one call
+    strikes = np.arange(S - 1000, S + 1050, 50)
+    chain = price_and_greeks_batch(S, strikes, T, r, sigma, type='call')
+    print(f"\n--- Batch Chain ({len(strikes)} strikes) ---")
+    print(f"ATM Price (batch): {chain['Price'][len(strikes) // 2]:.2f}")
\ No newline at end of file
@@ -1,57 +1,106 @@
 import pandas as pd
 import numpy as np
-from scipy.stats import norm
+from src.pricing_engine import price_batch
+from src.vol_surface import VolSurface
+from src.instrumentation import instrument
+
+GREEK_COLUMNS = ['Delta', 'Gamma', 'Vega', 'Theta']
+
+
+def var_es(pnl, confidence=0.95):
+    """
+    (VaR, Expected Shortfall) of a P&L sample, both as positive losses.
+    ES is the mean loss at or beyond VaR (VaR itself when the tail is empty).
+    """
+    pnl = np.asarray(pnl, dtype=float)
+    var = -np.quantile(pnl, 1 - confidence)
+    tail = pnl[pnl <= -var]
+    return float(var), float(-tail.mean()) if tail.size else float(var)
+
+
+def _grouped_sum(keys, weighted):
+    # Sums weighted Greeks per distinct key (e.g. Strike) in one bincount pass per Greek
+    codes, uniques = pd.factorize(keys, sort=True)
+    valid = codes >= 0
+    sums = np.column_stack([np.bincount(codes[valid], weights=weighted[valid, j], minlength=len(uniques))
+                            for j in range(weighted.shape[1])])
+    return pd.DataFrame(sums, index=pd.Index(uniques, name=keys.name),
+                        columns=['Net_' + g for g in GREEK_COLUMNS])
+
 
 class RiskManager:
     def __init__(self, lot_size=25, portfolio_value=1000000):
         self.lot_size = lot_size
         self.portfolio_value = portfolio_value # Capital allocated (e.g., 10 Lakhs)
 
-    def calculate_portfolio_risk(self, trades_df):
+    @instrument('risk.portfolio_risk')
+    def calculate_portfolio_risk(self, trades_df, breakdown=False):
         """
         Aggregates risk metrics across all active trades.
+        Vectorized: trade types are mapped to direction/multiplier codes once and
+        the weighted Greeks are summed column-wise. Rows that are neither Long
+        nor Short are skipped, so their Greeks (even NaN) are never read.
+        With breakdown=True
+        the result also holds per-strike ('By_Strike') and per-expiry
+        ('By_Expiry', when an 'Expiry_Days' or 'Expiry' column exists) tables.
         """
         if trades_df.empty:
             return None
 
-        # Initialize Totals
-        net_delta = 0
-        net_gamma = 0
-        net_vega = 0
-        net_theta = 0
-        
-        print("\n--- DETAILED RISK MONITOR ---")
-        
-        for index, row in trades_df.iterrows():
-            # Determine Direction (+1 for Long, -1 for Short)
-            if "Long" in row['Trade_Type']:
-                direction = 1
-            elif "Short" in row['Trade_Type']:
-                direction = -1
-            else:
-                continue
-
-            # Check if it's a Straddle (Double the risk: Call + Put)
-            multiplier = 2 if "Straddle" in row['Trade_Type'] else 1
-            
-            # Sum up Greeks (Direction * Greek * LotSize * Multiplier)
-            net_delta += direction * row['Delta'] * self.lot_size * multiplier
-            net_gamma += direction * row['Gamma'] * self.lot_size * multiplier
-            net_vega  += direction * row['Vega']  * self.lot_size * multiplier
-            net_theta += direction * row['Theta'] * self.lot_size * multiplier
+        # Signed weight per row = Direction (+1 Long / -1 Short / 0 skip) * LotSize * Multiplier
+        weights = self._trade_weights(trades_df['Trade_Type'])
+        live = weights != 0
+        greeks = trades_df[GREEK_COLUMNS].to_numpy(dtype=float)[live]
+        weighted = greeks * weights[live, None]
+        net_delta, net_gamma, net_vega, net_theta = weighted.sum(axis=0)
 
         # --- HEDGE CALCULATION (Delta Neutrality) ---
         futures_needed = -net_delta
-        futures_lots = round(futures_needed / self.lot_size)
+        futures_lots = round(float(futures_needed) / self.lot_size)
 
-        return {
-            'Net_Delta': net_delta,
-            'Net_Gamma': net_gamma,
-            'Net_Vega': net_vega,
-            'Net_Theta': net_theta,
+        result = {
+            'Net_Delta': float(net_delta),
+            'Net_Gamma': float(net_gamma),
+            'Net_Vega': float(net_vega),
+            'Net_Theta': float(net_theta),
             'Futures_Hedge_Lots': futures_lots
         }
 
+        if breakdown:
+            result['By_Strike'] = _grouped_sum(trades_df['Strike'][live], weighted)
+            for column in ('Expiry_Days', 'Expiry'):
+                if column in trades_df:
+                    result['By_Expiry'] = _grouped_sum(trades_df[column][live], weighted)
+                    break
+
+        return result
+
+    def _trade_weights(self, trade_types):
+        # Factorize once so the substring rules run per distinct type, not per row
+        codes, uniques = pd.factorize(trade_types)
+        per_type = np.array([self.trade_type_weight(t) for t in uniques], dtype=float)
+        if len(per_type) == 0:
+            return np.zeros(len(codes))
+        weights = per_type[codes]
+        weights[codes < 0] = 0  # Missing trade types are skipped
+        return weights
+
+    def trade_type_weight(self, trade_type):
+        """
+        Signed Greek weight of one trade type: Direction * LotSize * Multiplier.
+        """
+        # Determine Direction (+1 for Long, -1 for Short)
+        if "Long" in trade_type:
+            direction = 1
+        elif "Short" in trade_type:
+            direction = -1
+        else:
+            return 0
+
+        # Check if it's a Straddle (Double the risk: Call + Put)
+        multiplier = 2 if "Straddle" in trade_type else 1
+        return direction * self.lot_size * multiplier
+
     def calculate_var(self, net_delta, current_price, volatility, confidence=0.95):
         """
         Parametric VaR (Value at Risk).
@@ -61,6 +110,8 @@ class RiskManager:
         # Exposure in Rupee Terms = Net Delta * Spot Price
         exposure = net_delta * current_price
         
+        from scipy.stats import norm  # Deferred: slow import, only needed here
+
         # Z-score for 95% confidence (1.65) or 99% (2.33)
         z_score = norm.ppf(confidence)
         
@@ -70,15 +121,229 @@ class RiskManager:
         var_1day = abs(exposure * z_score * daily_vol)
         return var_1day
 
-    def stress_test(self, net_delta, net_gamma, spot_price, drop_percent=0.05):
+    def stress_test(self, net_delta, net_gamma, spot_price, drop_percent=0.05,
+                    book=None, volatility=None, days_forward=0, vol_shift=0.0):
         """
         Estimates P&L if market drops by X% (e.g., 5%).
         Uses Delta-Gamma approximation: PnL = (Delta * dS) + (0.5 * Gamma * dS^2)
+        When a book (and volatility) is given, every leg is fully repriced
+        instead, optionally `days_forward` later and with a vol shift.
         """
+        if book is not None:
+            surface = self.pnl_surface(book, spot_price, volatility, spot_moves=[-drop_percent],
+                                       days_forward=[days_forward], vol_shifts=[vol_shift])
+            return float(surface['PnL'][0, 0, 0])
+
         dS = spot_price * -drop_percent # Price change
         
         pnl_delta = net_delta * dS
         pnl_gamma = 0.5 * net_gamma * (dS ** 2)
         
         total_stress_pnl = pnl_delta + pnl_gamma
-        return total_stress_pnl
\ No newline at end of file
+        return total_stress_pnl
+
+    # --- FULL REVALUATION ---
+
+    def _book_legs(self, book, volatility, default_expiry_days=30):
+        """
+        Flattens a position book into per-leg arrays for batched repricing.
+        Uses 'Type' (Call/Put) when present; otherwise Straddle rows become a
+        call and a put leg. Optional columns: 'Qty' (units, default lot_size),
+        'Expiry_Days', 'Implied_Vol' (per-leg vol, else `volatility`: a flat
+        vol or a VolSurface read at each leg's strike and expiry) and
+        'Entry_Price' (per unit; NaN where unknown).
+        """
+        trade_types = book['Trade_Type'].astype(str)
+        direction = np.where(trade_types.str.contains('Long'), 1.0,
+                             np.where(trade_types.str.contains('Short'), -1.0, 0.0))
+
+        qty = book['Qty'].to_numpy(dtype=float) if 'Qty' in book else np.full(len(book), float(self.lot_size))
+        days = book['Expiry_Days'].to_numpy(dtype=float) if 'Expiry_Days' in book else np.full(len(book), float(default_expiry_days))
+        strike = book['Strike'].to_numpy(dtype=float)
+        if isinstance(volatility, VolSurface):
+            fallback = volatility.vol(strike, days / 365)
+        else:
+            fallback = np.full(len(book), float(volatility))
+        sigma = book['Implied_Vol'].to_numpy(dtype=float) if 'Implied_Vol' in book else fallback
+        sigma = np.where(sigma > 0.001, sigma, fallback)
+        entry = book['Entry_Price'].to_numpy(dtype=float) if 'Entry_Price' in book else np.full(len(book), np.nan)
+
+        if 'Type' in book:
+            is_call = book['Type'].astype(str).str.lower().to_numpy() == 'call'
+        else:
+            is_call = np.ones(len(book), dtype=bool)
+            straddle = trade_types.str.contains('Straddle').to_numpy()
+            # Add the put leg of every straddle row
+            strike = np.concatenate([strike, strike[straddle]])
+            direction = np.concatenate([direction, direction[straddle]])
+            qty = np.concatenate([qty, qty[straddle]])
+            days = np.concatenate([days, days[straddle]])
+            sigma = np.concatenate([sigma, sigma[straddle]])
+            entry = np.concatenate([entry, np.full(straddle.sum(), np.nan)])  # Row price is the call's
+            is_call = np.concatenate([is_call, np.zeros(straddle.sum(), dtype=bool)])
+
+        live = direction != 0
+        return {
+            'Strike': strike[live],
+            'Is_Call': is_call[live],
+            'Units': (direction * qty)[live],  # Signed quantity
+            'T': days[live] / 365,
+            'Sigma': sigma[live],
+            'Entry': entry[live]
+        }
+
+    @instrument('risk.pnl_surface')
+    def pnl_surface(self, book, current_price, volatility, spot_moves=None, days_forward=None,
+                    vol_shifts=None, risk_free_rate=0.07, chunk_size=None):
+        """
+        Full-revaluation P&L of a multi-leg book over a spot x time x vol grid.
+        `volatility` is a flat vol or a VolSurface (see _book_legs).
+
+        spot_moves: relative spot changes (default -10%..+10% in 1% steps)
+        days_forward: calendar days elapsed (default [0]); legs past expiry
+                      are settled at intrinsic value
+        vol_shifts: absolute changes in annual vol (default [0.0])
+
+        P&L is measured against each leg's 'Entry_Price' (per unit), or its
+        current model value where no entry price is known. Grid points are
+        repriced in one broadcasted pass over chunks of at most
+        chunk_size x legs elements to bound memory.
+        Returns PnL with shape (spots, days, vol shifts) plus the grid axes.
+        """
+        spot_moves = np.linspace(-0.10, 0.10, 21) if spot_moves is None else np.asarray(spot_moves, dtype=float)
+        days_forward = np.zeros(1) if days_forward is None else np.asarray(days_forward, dtype=float)
+        vol_shifts = np.zeros(1) if vol_shifts is None else np.asarray(vol_shifts, dtype=float)
+        shape = (len(spot_moves), len(days_forward), len(vol_shifts))
+
+        legs = self._book_legs(book, volatility)
+        n_legs = len(legs['Strike'])
+        spots = current_price * (1 + spot_moves)
+        result = {'PnL': np.zeros(shape), 'Spot': spots, 'Days': days_forward, 'Vol_Shift': vol_shifts,
+                  'Entry_Value': 0.0}
+        if n_legs == 0:
+            return result
+
+        # Unknown entry prices default to today's model value
+        entry = legs['Entry']
+        missing = np.isnan(entry)
+        if missing.any():
+            model = price_batch(current_price, legs['Strike'], legs['T'], risk_free_rate,
+                                legs['Sigma'], legs['Is_Call'])
+            entry = np.where(missing, model, entry)
+        entry_value = float(entry @ legs['Units'])
+
+        # Flat (spot, day, vol) index per grid point, reshaped back at the end
+        spot_idx, day_idx, vol_idx = (axis.ravel() for axis in np.indices(shape))
+        n_points = spot_idx.size
+        chunk_size = chunk_size or max(1, 2000000 // n_legs)
+        pnl = np.empty(n_points)
+
+        for start in range(0, n_points, chunk_size):
+            stop = min(start + chunk_size, n_points)
+            S = spots[spot_idx[start:stop]][:, None]
+            T = legs['T'][None, :] - days_forward[day_idx[start:stop]][:, None] / 365
+            sigma = np.maximum(legs['Sigma'][None, :] + vol_shifts[vol_idx[start:stop]][:, None], 0.001)
+            values = price_batch(S, legs['Strike'], T, risk_free_rate, sigma, legs['Is_Call'])
+            pnl[start:stop] = values @ legs['Units'] - entry_value
+
+        result['PnL'] = pnl.reshape(shape)
+        result['Entry_Value'] = entry_value
+        return result
+
+    @instrument('risk.full_revaluation_var')
+    def calculate_full_revaluation_var(self, book, current_price, volatility, method='monte_carlo',
+                                       spot_returns=None, vol_changes=None, n_scenarios=10000,
+                                       confidence=0.95, horizon_days=1, spot_vol_corr=-0.5,
+                                       vol_of_vol=1.0, risk_free_rate=0.07, chunk_size=None, seed=None):
+        """
+        Full-Revaluation VaR and Expected Shortfall.
+        Every leg is repriced under each joint (spot, vol) scenario, so gamma and
+        vega risk are captured exactly instead of via the delta-normal proxy.
+
+        method='historical': scenarios are the given spot_returns (horizon
+        returns) and optional vol_changes (absolute change in annual vol).
+        method='monte_carlo': correlated normal spot log-returns and vol moves
+        (vol_of_vol is the annualized volatility of the vol level). With a
+        VolSurface, the scenario dynamics use its ATM vol at the book's
+        size-weighted tenor; legs are still repriced at their surface vols.
+
+        Scenarios are generated and repriced in chunks of at most
+        chunk_size x legs elements to bound memory.
+        """
+        legs = self._book_legs(book, volatility)
+        n_legs = len(legs['Strike'])
+
+        if method == 'historical':
+            if spot_returns is None:
+                raise ValueError("Historical VaR needs spot_returns")
+            spot_returns = np.asarray(spot_returns, dtype=float)
+            vol_changes = np.zeros_like(spot_returns) if vol_changes is None else np.asarray(vol_changes, dtype=float)
+            n_scenarios = len(spot_returns)
+        elif method != 'monte_carlo':
+            raise ValueError(f"Unknown VaR method: {method}")
+
+        if n_legs == 0 or n_scenarios == 0:
+            return {'VaR': 0.0, 'Expected_Shortfall': 0.0, 'Scenarios': n_scenarios, 'Method': method}
+
+        # ~2M elements per chunk keeps each temporary around 16 MB
+        chunk_size = chunk_size or max(1, 2000000 // n_legs)
+
+        T_now = legs['T']
+        T_horizon = T_now - horizon_days / 365
+        base_value = np.dot(price_batch(current_price, legs['Strike'], T_now, risk_free_rate,
+                                        legs['Sigma'], legs['Is_Call']), legs['Units'])
+
+        scenario_vol = volatility
+        if method == 'monte_carlo' and isinstance(volatility, VolSurface):
+            scenario_vol = float(volatility.vol(current_price, np.average(T_now, weights=np.abs(legs['Units']))))
+
+        rng = np.random.default_rng(seed)
+        dt = horizon_days / 252
+        pnl = np.empty(n_scenarios)
+
+        for start in range(0, n_scenarios, chunk_size):
+            stop = min(start + chunk_size, n_scenarios)
+
+            if method == 'historical':
+                spot_move = spot_returns[start:stop]
+                vol_move = vol_changes[start:stop]
+            else:
+                z1 = rng.standard_normal(stop - start)
+                z2 = spot_vol_corr * z1 + np.sqrt(1 - spot_vol_corr ** 2) * rng.standard_normal(stop - start)
+                spot_move = np.expm1(-0.5 * scenario_vol ** 2 * dt + scenario_vol * np.sqrt(dt) * z1)
+                vol_move = vol_of_vol * scenario_vol * np.sqrt(dt) * z2
+
+            scenario_spot = (current_price * (1 + spot_move))[:, None]
+            scenario_sigma = np.maximum(legs['Sigma'][None, :] + vol_move[:, None], 0.001)
+            values = price_batch(scenario_spot, legs['Strike'], T_horizon, risk_free_rate,
+                                 scenario_sigma, legs['Is_Call'])
+            pnl[start:stop] = values @ legs['Units'] - base_value
+
+        var, es = var_es(pnl, confidence)
+        return {
+            'VaR': var,
+            'Expected_Shortfall': es,
+            'Scenarios': n_scenarios,
+            'Method': method
+        }
+
+
+if __name__ == "__main__":
+    # Smoke check: a VolSurface works with both VaR methods
+    rm = RiskManager(lot_size=25)
+    book = pd.DataFrame({'Strike': [23800, 24000, 24200], 'Expiry_Days': [7, 30, 30],
+                         'Trade_Type': ['Short Call', 'Long Straddle', 'Short Call']})
+    strikes = np.arange(23000, 25050, 50)
+    surface = VolSurface()
+    for days, level in ((7, 0.14), (30, 0.15), (60, 0.16)):
+        surface.update_slice(days / 365, strikes, level + 0.4 * ((strikes - 24000) / 24000) ** 2)
+
+    mc = rm.calculate_full_revaluation_var(book, 24000, surface, method='monte_carlo', n_scenarios=20000, seed=1)
+    atm = float(surface.vol(24000, (7 + 30 + 30 + 30) / 4 / 365))  # Size-weighted tenor (straddle = 2 legs)
+    flat = rm.calculate_full_revaluation_var(book, 24000, atm, method='monte_carlo', n_scenarios=20000, seed=1)
+    assert mc['VaR'] > 0 and np.isfinite(mc['Expected_Shortfall']), "surface Monte Carlo VaR failed"
+    assert abs(mc['VaR'] / flat['VaR'] - 1) < 0.25, "surface and ATM flat-vol VaR disagree"
+
+    returns = np.random.default_rng(2).normal(0, 0.01, 500)
+    hist = rm.calculate_full_revaluation_var(book, 24000, surface, method='historical', spot_returns=returns)
+    print(f"Surface VaR OK: Monte Carlo {mc['VaR']:,.0f} (flat ATM {flat['VaR']:,.0f}), historical {hist['VaR']:,.0f}")
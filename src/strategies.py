@@ -1,5 +1,21 @@
 import pandas as pd
 import numpy as np
+from src.instrumentation import instrument
+
+# --- SIGNAL CODES ---
+# Compact integer codes shared by the vectorized paths. The same code indexes
+# the human-readable signal, its trade type and its trade side (+1 BUY / -1 SELL).
+SIGNAL_HOLD = 0
+SIGNAL_SELL_VOL = 1
+SIGNAL_BUY_VOL = 2
+SIGNAL_BUY_STRADDLE = 3
+SIGNAL_SELL_STRADDLE = 4
+
+SIGNAL_LABELS = ["HOLD", "SELL_VOL (Overpriced)", "BUY_VOL (Cheap)",
+                 "*** BUY STRADDLE (Low Vol)", "*** SELL STRADDLE (High Vol)"]
+TRADE_TYPE_LABELS = ["None", "Short Call", "Long Call", "Long Straddle", "Short Straddle"]
+SIGNAL_SIDES = np.array([0, -1, 1, 1, -1], dtype=np.int8)
+
 
 class VolatilityStrategy:
     def __init__(self, volatility_threshold=0.02, risk_free_rate=0.07):
@@ -30,54 +46,225 @@ class VolatilityStrategy:
         
         return df
 
+    @instrument('strategy.generate_signals')
     def generate_signals(self, df, current_spot):
         """
         Generates signals for Outliers (Strategy A) and Straddles (Strategy B).
+        Signal and Trade_Type are categorical columns backed by Signal_Code.
         """
         # 1. Fit the Smile Curve first
         df = self.fit_iv_smile(df)
         
-        signals = []
-        trade_types = []
-        
-        # 2. Analyze each option
-        for index, row in df.iterrows():
-            iv = row['Implied_Vol']
-            fair_iv = row.get('Fair_IV', iv) # Default to IV if fit failed
-            spread = row.get('IV_Spread', 0)
-            
-            signal = "HOLD"
-            trade_type = "None"
-            
-            # --- STRATEGY A: OUTLIER DETECTION (Relative to Curve) ---
-            # If Implied Vol is significantly higher than the Fitted Curve -> Sell
-            if spread > self.threshold:
-                signal = "SELL_VOL (Overpriced)"
-                trade_type = "Short Call" # Simplifying to Calls for now
-            
-            # If Implied Vol is significantly lower -> Buy
-            elif spread < -self.threshold:
-                signal = "BUY_VOL (Cheap)"
-                trade_type = "Long Call"
-
-            # --- STRATEGY B: ATM STRADDLE LOGIC (VIX Mean Reversion) ---
-            # If this is the ATM Strike (closest to Spot)
-            if abs(row['Strike'] - current_spot) < 25:
-                # If IV is historically LOW (< 12%), Buy Straddle (Bet on explosion)
-                if iv < 0.12:
-                    signal = "*** BUY STRADDLE (Low Vol)"
-                    trade_type = "Long Straddle"
-                # If IV is historically HIGH (> 20%), Sell Straddle (Bet on calm)
-                elif iv > 0.20:
-                    signal = "*** SELL STRADDLE (High Vol)"
-                    trade_type = "Short Straddle"
-
-            signals.append(signal)
-            trade_types.append(trade_type)
-            
-        df['Signal'] = signals
-        df['Trade_Type'] = trade_types
-        return df
+        # 2. Classify every option at once (spread is NaN if the fit failed)
+        spread = df['IV_Spread'] if 'IV_Spread' in df else np.nan
+        codes = self.classify_signals(spread, df['Implied_Vol'], df['Strike'], current_spot)
+        return _attach_signals(df, codes)
+
+    @instrument('strategy.generate_signals_batch')
+    def generate_signals_batch(self, df, snapshot_col='Date', spot_col='Spot'):
+        """
+        Batch mode: many chain snapshots in one long-format frame (snapshot x strike).
+        Every snapshot's smile is fitted with a vectorized least-squares solve
+        (one batched 3x3 normal-equation solve across all snapshots) and the
+        Strategy A / B rules are applied with array masks.
+        """
+        df = df.copy()
+        snapshot_codes, snapshots = pd.factorize(df[snapshot_col])
+        fair_iv = _fit_smiles(snapshot_codes, len(snapshots),
+                              df['Strike'].to_numpy(dtype=float), df['Implied_Vol'].to_numpy(dtype=float))
+
+        df['Fair_IV'] = fair_iv
+        df['IV_Spread'] = df['Implied_Vol'] - fair_iv
+        codes = self.classify_signals(df['IV_Spread'], df['Implied_Vol'], df['Strike'], df[spot_col])
+        return _attach_signals(df, codes)
+
+    def classify_signals(self, spread, iv, strike, spot):
+        """
+        Array version of the Strategy A / Strategy B rules in generate_signals.
+        All inputs broadcast; returns int8 signal codes (see SIGNAL_LABELS).
+        NaN spreads (no smile fit) never trigger Strategy A.
+        """
+        spread = np.asarray(spread, dtype=float)
+        iv = np.asarray(iv, dtype=float)
+        codes = np.full(np.broadcast(spread, iv, strike, spot).shape, SIGNAL_HOLD, dtype=np.int8)
+
+        # --- STRATEGY A: OUTLIER DETECTION (Relative to Curve) ---
+        codes[np.broadcast_to(spread > self.threshold, codes.shape)] = SIGNAL_SELL_VOL
+        codes[np.broadcast_to(spread < -self.threshold, codes.shape)] = SIGNAL_BUY_VOL
+
+        # --- STRATEGY B: ATM STRADDLE LOGIC (overrides Strategy A) ---
+        is_atm = np.abs(np.asarray(strike, dtype=float) - spot) < 25
+        codes[np.broadcast_to(is_atm & (iv < 0.12), codes.shape)] = SIGNAL_BUY_STRADDLE
+        codes[np.broadcast_to(is_atm & (iv > 0.20), codes.shape)] = SIGNAL_SELL_STRADDLE
+
+        return codes
 
     def get_trade_log(self, df):
-        return df[df['Signal'] != "HOLD"]
\ No newline at end of file
+        return df[df['Signal'] != "HOLD"]
+
+
+class IncrementalSmile:
+    """
+    Incremental version of VolatilityStrategy.fit_iv_smile for live/replayed feeds.
+
+    Per expiry it keeps the weighted least-squares sufficient statistics of the
+    parabola IV = a*x^2 + b*x + c (x = (Strike - center) / scale), so quote
+    updates, inserts and removals are O(1) and the coefficients are solved on
+    demand. With half_life set, every quote's weight decays exponentially in
+    the clock units passed to advance(), so stale quotes age out.
+    """
+    # Statistics layout: [sum w*x^0..x^4, sum w*y*x^0..x^2]
+    _N_STATS = 8
+
+    def __init__(self, half_life=None, scale=1000.0, rebuild_every=10000):
+        self.decay_rate = np.log(2) / half_life if half_life else 0.0
+        self.scale = scale
+        self.rebuild_every = rebuild_every  # Periodic exact recompute bounds float drift
+        self.clock = 0.0
+        self._slices = {}
+
+    def _slice(self, expiry, strike):
+        if expiry not in self._slices:
+            self._slices[expiry] = {'center': float(strike), 'quotes': {},
+                                    'stats': np.zeros(self._N_STATS), 'updates': 0}
+        return self._slices[expiry]
+
+    def _features(self, smile, strike, iv):
+        x = (strike - smile['center']) / self.scale
+        x2 = x * x
+        return np.array([1.0, x, x2, x2 * x, x2 * x2, iv, iv * x, iv * x2])
+
+    def _current_weight(self, weight, stamp):
+        if self.decay_rate == 0.0:
+            return weight
+        return weight * np.exp(-self.decay_rate * (self.clock - stamp))
+
+    def update(self, strike, iv, expiry=None, weight=1.0):
+        """
+        Inserts or replaces the quote at `strike`. Invalid IVs (<= 0.001, NaN)
+        just remove the existing quote, mirroring fit_iv_smile's filter.
+        """
+        smile = self._slice(expiry, strike)
+        self._drop(smile, strike)
+        if iv > 0.001:
+            smile['quotes'][strike] = (iv, weight, self.clock)
+            smile['stats'] += weight * self._features(smile, strike, iv)
+        self._touch(smile)
+
+    def remove(self, strike, expiry=None):
+        smile = self._slices.get(expiry)
+        if smile is not None:
+            self._drop(smile, strike)
+            self._touch(smile)
+
+    def _drop(self, smile, strike):
+        quote = smile['quotes'].pop(strike, None)
+        if quote is not None:
+            iv, weight, stamp = quote
+            smile['stats'] -= self._current_weight(weight, stamp) * self._features(smile, strike, iv)
+
+    def _touch(self, smile):
+        smile['updates'] += 1
+        if smile['updates'] >= self.rebuild_every:
+            self._rebuild(smile)
+
+    def _rebuild(self, smile):
+        smile['stats'] = np.zeros(self._N_STATS)
+        for strike, (iv, weight, stamp) in smile['quotes'].items():
+            smile['stats'] += self._current_weight(weight, stamp) * self._features(smile, strike, iv)
+        smile['updates'] = 0
+
+    def advance(self, elapsed):
+        """
+        Moves the clock forward; with decay every weight shrinks by exp(-rate * elapsed).
+        """
+        self.clock += elapsed
+        if self.decay_rate:
+            factor = np.exp(-self.decay_rate * elapsed)
+            for smile in self._slices.values():
+                smile['stats'] *= factor
+
+    def coefficients(self, expiry=None):
+        """
+        Returns (a, b, c) in scaled-strike units, or None if fewer than 3 quotes.
+        """
+        smile = self._slices.get(expiry)
+        if smile is None or len(smile['quotes']) < 3:
+            return None
+        s = smile['stats']
+        normal = np.array([[s[4], s[3], s[2]],
+                           [s[3], s[2], s[1]],
+                           [s[2], s[1], s[0]]])
+        try:
+            return np.linalg.solve(normal, s[[7, 6, 5]])
+        except np.linalg.LinAlgError:
+            return None
+
+    def fair_iv(self, strikes, expiry=None):
+        coeffs = self.coefficients(expiry)
+        strikes = np.asarray(strikes, dtype=float)
+        if coeffs is None:
+            return np.full(strikes.shape, np.nan)
+        x = (strikes - self._slices[expiry]['center']) / self.scale
+        return (coeffs[0] * x + coeffs[1]) * x + coeffs[2]
+
+    def apply(self, df, expiry=None):
+        """
+        Same output as VolatilityStrategy.fit_iv_smile (Fair_IV, IV_Spread),
+        from the incrementally maintained fit. Returns df unchanged if no fit.
+        """
+        if self.coefficients(expiry) is None:
+            return df
+        df['Fair_IV'] = self.fair_iv(df['Strike'], expiry)
+        df['IV_Spread'] = df['Implied_Vol'] - df['Fair_IV']
+        return df
+
+
+def _attach_signals(df, codes):
+    codes = np.asarray(codes, dtype=np.int8)
+    df['Signal_Code'] = codes
+    df['Signal'] = pd.Categorical.from_codes(codes, categories=SIGNAL_LABELS)
+    df['Trade_Type'] = pd.Categorical.from_codes(codes, categories=TRADE_TYPE_LABELS)
+    return df
+
+
+def _fit_smiles(groups, n_groups, strikes, ivs):
+    """
+    Least-squares parabola IV = a*x^2 + b*x + c per group, fitted for all
+    groups at once. Strikes are centred and scaled per group for conditioning.
+    Returns the fitted IV per row (NaN where a group has < 3 usable quotes).
+    """
+    valid = (ivs > 0.001) & (groups >= 0)
+    g = groups[valid]
+
+    count = np.bincount(g, minlength=n_groups).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        center = np.bincount(g, weights=strikes[valid], minlength=n_groups) / count
+        spread = np.sqrt(np.bincount(g, weights=(strikes[valid] - center[g]) ** 2, minlength=n_groups) / count)
+    scale = np.where(spread > 0, spread, 1.0)
+
+    safe_groups = np.where(groups >= 0, groups, 0)
+    x_all = (strikes - np.nan_to_num(center)[safe_groups]) / scale[safe_groups]
+    x, y = x_all[valid], ivs[valid]
+
+    # Sufficient statistics: sum x^k (k = 0..4) and sum y*x^k (k = 0..2)
+    powers = [np.bincount(g, weights=x ** k, minlength=n_groups) for k in range(5)]
+    moments = [np.bincount(g, weights=y * x ** k, minlength=n_groups) for k in range(3)]
+
+    normal = np.empty((n_groups, 3, 3))
+    for i in range(3):
+        for j in range(3):
+            normal[:, i, j] = powers[4 - i - j]
+    rhs = np.stack([moments[2], moments[1], moments[0]], axis=1)
+
+    # Need 3+ quotes over distinct strikes (non-singular system)
+    fittable = (count >= 3) & (spread > 0)
+    fittable[fittable] &= np.abs(np.linalg.det(normal[fittable])) > 1e-12
+    coeffs = np.full((n_groups, 3), np.nan)
+    if fittable.any():
+        coeffs[fittable] = np.linalg.solve(normal[fittable], rhs[fittable][..., None])[..., 0]
+
+    row_coeffs = coeffs[safe_groups]
+    fair_iv = row_coeffs[:, 0] * x_all ** 2 + row_coeffs[:, 1] * x_all + row_coeffs[:, 2]
+    fair_iv[groups < 0] = np.nan
+    return fair_iv
@@ -0,0 +1,265 @@
+import asyncio
+import math
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from src.pricing_engine import price_and_greeks_batch
+from src.strategies import VolatilityStrategy, TRADE_TYPE_LABELS, SIGNAL_HOLD
+from src.risk_manager import RiskManager
+
+_STOP = object()  # End-of-stream marker passed down the stage queues
+
+
+class RollingVolatility:
+    """
+    O(1) rolling return / variance update for streaming bars or ticks.
+    Keeps the last `window` returns in a ring buffer with running sums; the
+    sums are recomputed exactly every `resync_every` updates to bound drift.
+    Volatility matches returns.rolling(window).std() * sqrt(periods_per_year).
+    """
+    def __init__(self, window=21, periods_per_year=252, resync_every=10000):
+        self.window = window
+        self.periods_per_year = periods_per_year
+        self.resync_every = resync_every
+        self.returns = deque(maxlen=window)
+        self.last_price = None
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._updates = 0
+
+    def update(self, price):
+        """
+        Adds one price; returns (return, annualized vol). Vol is None until
+        the window is full.
+        """
+        if self.last_price is None:
+            self.last_price = price
+            return None, None
+
+        ret = price / self.last_price - 1
+        self.last_price = price
+
+        if len(self.returns) == self.window:
+            old = self.returns[0]
+            self._sum -= old
+            self._sum_sq -= old * old
+        self.returns.append(ret)
+        self._sum += ret
+        self._sum_sq += ret * ret
+
+        self._updates += 1
+        if self._updates >= self.resync_every:
+            self._sum = math.fsum(self.returns)
+            self._sum_sq = math.fsum(r * r for r in self.returns)
+            self._updates = 0
+
+        return ret, self.volatility()
+
+    def update_batch(self, prices, keep=None):
+        """
+        Vectorized update with a block of prices, leaving the same state as
+        calling update() on each. Returns the annualized vol after every price
+        (NaN until the window is full). `keep` masks which returns enter the
+        window (e.g. False for overnight gaps); skipped bars repeat the last vol.
+        """
+        prices = np.asarray(prices, dtype=float)
+        if len(prices) == 0:
+            return np.zeros(0)
+        last = self.last_price if self.last_price is not None else np.nan
+        rets = prices / np.concatenate(([last], prices[:-1])) - 1
+        valid = ~np.isnan(rets)
+        if keep is not None:
+            valid &= np.asarray(keep, dtype=bool)
+        new = rets[valid]
+        self.last_price = float(prices[-1])
+
+        # Windowed sums over [carried returns | new returns] from prefix sums,
+        # centered on the block mean to keep the differences precise
+        history = np.concatenate((np.fromiter(self.returns, dtype=float, count=len(self.returns)), new))
+        w = self.window
+        centered = history - (history.mean() if len(history) else 0.0)
+        sums = np.concatenate(([0.0], np.cumsum(centered)))
+        sums_sq = np.concatenate(([0.0], np.cumsum(centered * centered)))
+        ends = np.arange(len(self.returns), len(history)) + 1
+        starts = np.maximum(ends - w, 0)
+        s, s2 = sums[ends] - sums[starts], sums_sq[ends] - sums_sq[starts]
+        variance = np.maximum((s2 - s * s / w) / (w - 1), 0.0)
+        new_vols = np.where(ends >= w, np.sqrt(variance * self.periods_per_year), np.nan)
+
+        current = self.volatility()
+        seen = np.cumsum(valid) - 1  # Index of the latest new return at each bar
+        vols = np.full(len(prices), np.nan if current is None else current)
+        if len(new):
+            vols[seen >= 0] = new_vols[seen[seen >= 0]]
+
+        self.returns.extend(new[-w:].tolist())
+        self._sum = math.fsum(self.returns)
+        self._sum_sq = math.fsum(r * r for r in self.returns)
+        self._updates = 0
+        return vols
+
+    def volatility(self):
+        n = len(self.returns)
+        if n < self.window:
+            return None
+        variance = (self._sum_sq - self._sum * self._sum / n) / (n - 1)
+        return math.sqrt(max(variance, 0.0) * self.periods_per_year)
+
+
+# --- SOURCES ---
+# Async iterables of (timestamp, price). `rate` paces replay in ticks/second.
+
+async def iterable_source(rows, rate=None):
+    delay = 1.0 / rate if rate else 0.0
+    for timestamp, price in rows:
+        yield timestamp, float(price)
+        await asyncio.sleep(delay)
+
+
+async def csv_replay_source(path, price_column='Close', rate=None, chunksize=100000):
+    """
+    Replays a bar/tick file (timestamp index in the first column) in chunks.
+    """
+    delay = 1.0 / rate if rate else 0.0
+    for chunk in pd.read_csv(path, index_col=0, chunksize=chunksize):
+        for timestamp, price in zip(chunk.index, chunk[price_column].to_numpy(dtype=float)):
+            yield timestamp, price
+            await asyncio.sleep(delay)
+
+
+async def socket_source(host='127.0.0.1', port=9009):
+    """
+    Local socket stand-in for a live feed: newline-delimited "timestamp,price".
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            timestamp, _, price = line.decode().strip().partition(',')
+            if price:
+                yield timestamp, float(price)
+    finally:
+        writer.close()
+
+
+class StreamingPipeline:
+    """
+    Streaming mode: ticks flow through async stages connected by bounded
+    queues, so a slow stage applies backpressure all the way to the source.
+
+        source -> rolling vol (O(1)) -> chain repricing -> strategy signals -> risk aggregation
+
+    Each tick is stamped when the source emits it; end-to-end latency is
+    recorded when its risk snapshot is produced.
+    """
+    def __init__(self, strategy=None, risk_manager=None, window=21, periods_per_year=252,
+                 expiry_days=30, risk_free_rate=0.07, strike_step=50, strike_range=1000,
+                 queue_size=64, on_result=None, latency_window=100000):
+        self.strategy = strategy or VolatilityStrategy(volatility_threshold=0.015)
+        self.risk_manager = risk_manager or RiskManager(lot_size=25)
+        self.vol = RollingVolatility(window, periods_per_year)
+        self.expiry = expiry_days / 365
+        self.r = risk_free_rate
+        self.strike_step = strike_step
+        self.strike_offsets = np.arange(-strike_range, strike_range + strike_step, strike_step, dtype=float)
+        self.queue_size = queue_size
+        self.on_result = on_result  # Optional callback per risk snapshot
+        self.latencies_ns = deque(maxlen=latency_window)  # Most recent ticks only: bounded on endless feeds
+        self.ticks = 0
+        self.last_result = None
+
+        # Signal code -> signed Greek weight, resolved once instead of per tick
+        self._code_weights = np.array([self.risk_manager.trade_type_weight(t) for t in TRADE_TYPE_LABELS],
+                                      dtype=float)
+
+    # --- STAGES ---
+
+    async def _ingest(self, source, out):
+        async for timestamp, price in source:
+            await out.put((time.perf_counter_ns(), timestamp, price))
+        await out.put(_STOP)
+
+    async def _volatility_stage(self, inp, out):
+        while (item := await inp.get()) is not _STOP:
+            stamp, timestamp, price = item
+            _, vol = self.vol.update(price)
+            if vol is not None and vol > 0:
+                await out.put((stamp, timestamp, price, vol))
+        await out.put(_STOP)
+
+    async def _pricing_stage(self, inp, out):
+        while (item := await inp.get()) is not _STOP:
+            stamp, timestamp, spot, vol = item
+            center = round(spot / self.strike_step) * self.strike_step
+            strikes = center + self.strike_offsets
+            greeks = price_and_greeks_batch(spot, strikes, self.expiry, self.r, vol, True)
+            await out.put((stamp, timestamp, spot, vol, strikes, greeks))
+        await out.put(_STOP)
+
+    async def _signal_stage(self, inp, out):
+        while (item := await inp.get()) is not _STOP:
+            stamp, timestamp, spot, vol, strikes, greeks = item
+            # Chain is priced off one realized vol, so no smile spread: only Strategy B can fire
+            codes = self.strategy.classify_signals(np.nan, vol, strikes, spot)
+            await out.put((stamp, timestamp, spot, vol, strikes, greeks, codes))
+        await out.put(_STOP)
+
+    async def _risk_stage(self, inp):
+        while (item := await inp.get()) is not _STOP:
+            stamp, timestamp, spot, vol, strikes, greeks, codes = item
+            weights = self._code_weights[codes]
+            net_delta = float(weights @ greeks['Delta'])
+            result = {
+                'Timestamp': timestamp,
+                'Spot': spot,
+                'Volatility': vol,
+                'Signals': int(np.count_nonzero(codes != SIGNAL_HOLD)),
+                'Net_Delta': net_delta,
+                'Net_Gamma': float(weights @ greeks['Gamma']),
+                'Net_Vega': float(weights @ greeks['Vega']),
+                'Net_Theta': float(weights @ greeks['Theta']),
+                'Futures_Hedge_Lots': round(-net_delta / self.risk_manager.lot_size)
+            }
+            self.latencies_ns.append(time.perf_counter_ns() - stamp)
+            self.ticks += 1
+            self.last_result = result
+            if self.on_result is not None:
+                self.on_result(result)
+
+    # --- DRIVER ---
+
+    async def run(self, source):
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(4)]
+        await asyncio.gather(
+            self._ingest(source, queues[0]),
+            self._volatility_stage(queues[0], queues[1]),
+            self._pricing_stage(queues[1], queues[2]),
+            self._signal_stage(queues[2], queues[3]),
+            self._risk_stage(queues[3]),
+        )
+        return self.latency_stats()
+
+    def run_sync(self, source):
+        return asyncio.run(self.run(source))
+
+    def latency_stats(self):
+        """
+        End-to-end per-tick latency summary in microseconds over the last
+        latency_window ticks ('Ticks' counts every tick processed).
+        """
+        if not self.latencies_ns:
+            return {'Ticks': self.ticks}
+        lat = np.fromiter(self.latencies_ns, dtype=np.int64, count=len(self.latencies_ns)) / 1000
+        return {
+            'Ticks': self.ticks,
+            'Window': len(lat),
+            'P50_us': float(np.percentile(lat, 50)),
+            'P99_us': float(np.percentile(lat, 99)),
+            'Max_us': float(lat.max()),
+            'Mean_us': float(lat.mean())
+        }
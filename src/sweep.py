@@ -0,0 +1,343 @@
+import argparse
+import ast
+import contextlib
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from src.backtester import Backtester, _column_values
+
+# Price series attached once per worker process (see _init_worker)
+_WORKER_DATA = {}
+
+
+class SharedPriceSeries:
+    """
+    Publishes a price frame (Close, Volatility, index) into one shared memory
+    block so pool workers can attach to it instead of receiving a pickled copy
+    with every task.
+    """
+    def __init__(self, price_data):
+        close = _column_values(price_data, 'Close')
+        vol = _column_values(price_data, 'Volatility')
+        index = price_data.index
+        self.is_datetime = isinstance(index, pd.DatetimeIndex)
+        self.tz = str(index.tz) if self.is_datetime and index.tz is not None else None
+        stamps = index.as_unit('ns').asi8 if self.is_datetime else np.asarray(index, dtype=np.int64)
+
+        self.length = len(close)
+        # Layout: [close | vol] as float64 followed by the index as int64
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, 3 * self.length * 8))
+        values, shared_stamps = _layout(self.shm, self.length)
+        values[0] = close
+        values[1] = vol
+        shared_stamps[:] = stamps
+
+    def handle(self):
+        # Small picklable descriptor passed to worker initializers
+        return (self.shm.name, self.length, self.is_datetime, self.tz)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _layout(shm, length):
+    values = np.ndarray((2, length), dtype=np.float64, buffer=shm.buf)
+    stamps = np.ndarray((length,), dtype=np.int64, buffer=shm.buf, offset=2 * length * 8)
+    return values, stamps
+
+
+def _attach(handle):
+    name, length, is_datetime, tz = handle
+    shm = shared_memory.SharedMemory(name=name)
+    values, stamps = _layout(shm, length)
+    if is_datetime:
+        index = pd.DatetimeIndex(stamps.view('datetime64[ns]'))
+        if tz is not None:
+            index = index.tz_localize('UTC').tz_convert(tz)
+    else:
+        index = pd.Index(stamps)
+    # Columns are views of the shared block (no per-worker copy of the history)
+    frame = pd.DataFrame(values.T, columns=['Close', 'Volatility'], index=index, copy=False)
+    return shm, frame
+
+
+def _init_worker(handle):
+    shm, frame = _attach(handle)
+    _WORKER_DATA['shm'] = shm  # Keep the mapping alive for the worker's lifetime
+    _WORKER_DATA['frame'] = frame
+
+
+def _quietly(fn, *args):
+    # Silences per-run Backtester prints inside workers
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return fn(*args)
+
+
+def summarize_equity(equity_df, initial_capital):
+    """
+    ROI and max drawdown (both in %) from an equity curve frame.
+    """
+    equity = equity_df['Equity'].to_numpy(dtype=float)
+    if len(equity) == 0:
+        return {'ROI': 0.0, 'Max_Drawdown': 0.0}
+    peak = np.maximum.accumulate(equity)
+    return {
+        'ROI': float((equity[-1] - initial_capital) / initial_capital * 100),
+        'Max_Drawdown': float(np.min(equity / peak - 1)) * 100
+    }
+
+
+def run_config(price_data, params, engine='columnar', return_equity=False):
+    """
+    Runs one backtest configuration and returns its metrics row, or
+    (row, equity array) with return_equity=True.
+    """
+    start = time.perf_counter()
+    bt = Backtester(**params)
+    equity_df = bt.run_backtest(price_data, engine=engine)
+    row = dict(params)
+    row.update(summarize_equity(equity_df, bt.capital))
+    row['Trades'] = len(bt.transaction_log)
+    row['Runtime'] = time.perf_counter() - start
+    if return_equity:
+        return row, equity_df['Equity'].to_numpy(dtype=float)
+    return row
+
+
+def _run_config_task(args):
+    # bounds=(start, stop) runs on a positional slice of the shared frame: a view, not a copy
+    params, engine, bounds, return_equity = args
+    frame = _WORKER_DATA['frame']
+    if bounds is not None:
+        frame = frame.iloc[bounds[0]:bounds[1]]
+    return _quietly(run_config, frame, params, engine, return_equity)
+
+
+@contextlib.contextmanager
+def _shared_pool(price_data, max_workers=None):
+    """
+    Publishes the price series to shared memory once and yields a
+    map(tasks) function over a process pool whose workers attach to it.
+    Tasks are (params, engine, bounds, return_equity) tuples for _run_config_task.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    shared = SharedPriceSeries(price_data)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shared.handle(),)) as pool:
+            def run(tasks):
+                # Batch several tasks per IPC round trip on big sweeps
+                chunksize = max(1, len(tasks) // (workers * 4))
+                return list(pool.map(_run_config_task, tasks, chunksize=chunksize))
+            yield run
+    finally:
+        shared.close()
+
+
+def expand_grid(param_grid):
+    """
+    {'profit_target': [1000, 2000], 'stop_loss': [-500]} -> list of config dicts.
+    A list of dicts is passed through unchanged.
+    """
+    if isinstance(param_grid, dict):
+        keys = list(param_grid)
+        return [dict(zip(keys, values)) for values in itertools.product(*(param_grid[k] for k in keys))]
+    return list(param_grid)
+
+
+def run_sweep(price_data, param_grid, max_workers=None, engine='columnar'):
+    """
+    Fans Backtester runs for every configuration out over a process pool.
+    The price series is shared with workers once via shared memory.
+    Returns one tidy results table: parameters + ROI, Max_Drawdown, Trades, Runtime.
+    """
+    configs = expand_grid(param_grid)
+    if not configs:
+        return pd.DataFrame()
+
+    with _shared_pool(price_data, max_workers) as run:
+        rows = run([(c, engine, None, False) for c in configs])
+    return pd.DataFrame(rows)
+
+
+# --- WALK-FORWARD ---
+
+def walk_forward_windows(n_bars, train_bars, test_bars, anchored=False):
+    """
+    (train_start, train_stop, test_start, test_stop) bar positions covering
+    n_bars. Test windows are consecutive and never overlap; rolling train
+    windows keep a fixed length, anchored ones always start at bar 0.
+    """
+    if train_bars <= 0 or test_bars <= 0:
+        raise ValueError("train_bars and test_bars must be positive")
+    windows = []
+    test_start = train_bars
+    while test_start < n_bars:
+        test_stop = min(test_start + test_bars, n_bars)
+        train_start = 0 if anchored else test_start - train_bars
+        windows.append((train_start, test_start, test_start, test_stop))
+        test_start = test_stop
+    return windows
+
+
+def stitch_segments(segments, initial_capital):
+    """
+    Chains out-of-sample equity segments into one curve: each segment's
+    returns on its own starting capital compound onto the previous
+    segment's closing equity.
+    """
+    level = float(initial_capital)
+    stitched = []
+    for equity, capital in segments:
+        curve = level * np.asarray(equity, dtype=float) / capital
+        stitched.append(curve)
+        if len(curve):
+            level = float(curve[-1])
+    return np.concatenate(stitched) if stitched else np.zeros(0)
+
+
+def run_walk_forward(price_data, param_grid, train_bars, test_bars, anchored=False, objective='ROI',
+                     max_workers=None, engine='columnar'):
+    """
+    Walk-forward study: every configuration is backtested on each train
+    window, the one with the best `objective` (any column of the sweep table,
+    higher is better) is run on the following test window, and the test
+    equity segments are stitched into one out-of-sample curve.
+
+    All (window, config) train runs and then all test runs are fanned out over
+    one process pool attached to a single shared-memory copy of the prices.
+    Returns {'Windows': per-window table, 'Equity': stitched DataFrame, 'Summary'}.
+    """
+    configs = expand_grid(param_grid) or [{}]
+    windows = walk_forward_windows(len(price_data), train_bars, test_bars, anchored)
+    if not windows:
+        raise ValueError(f"Need more than {train_bars} bars for a walk-forward study, got {len(price_data)}")
+
+    with _shared_pool(price_data, max_workers) as run:
+        train = pd.DataFrame(run([(c, engine, (a, b), False) for a, b, _, _ in windows for c in configs]))
+        train['Window'] = np.repeat(np.arange(len(windows)), len(configs))
+        best = train.loc[train.groupby('Window')[objective].idxmax()]
+        best_params = [configs[i % len(configs)] for i in best.index]
+        segments = run([(params, engine, (c, d), True) for (_, _, c, d), params in zip(windows, best_params)])
+
+    index = price_data.index
+    rows = []
+    for w, ((a, b, c, d), params, (test_row, _)) in enumerate(zip(windows, best_params, segments)):
+        row = {'Window': w, 'Train_Start': index[a], 'Train_End': index[b - 1],
+               'Test_Start': index[c], 'Test_End': index[d - 1]}
+        row.update(params)
+        row['Train_' + objective] = float(best[objective].iloc[w])
+        row.update({'Test_' + k: test_row[k] for k in ('ROI', 'Max_Drawdown', 'Trades')})
+        rows.append(row)
+
+    initial_capital = Backtester(**configs[0]).capital
+    stitched = stitch_segments([(equity, Backtester(**params).capital)
+                                for (_, equity), params in zip(segments, best_params)], initial_capital)
+    equity_df = pd.DataFrame({'Date': index[windows[0][2]:windows[-1][3]], 'Equity': stitched})
+    return {
+        'Windows': pd.DataFrame(rows),
+        'Equity': equity_df,
+        'Summary': summarize_equity(equity_df, initial_capital)
+    }
+
+
+def _parse_grid_arg(text):
+    # "profit_target=1000,2000,3000" -> ('profit_target', [1000, 2000, 3000])
+    name, _, values = text.partition('=')
+    return name.strip(), [ast.literal_eval(v.strip()) for v in values.split(',') if v.strip()]
+
+
+def build_parser(parser=None):
+    parser = parser or argparse.ArgumentParser(description="Parallel parameter sweep for the Backtester")
+    parser.add_argument('--grid', action='append', default=[], metavar='NAME=V1,V2,...',
+                        help="Backtester parameter and values to sweep (repeatable)")
+    parser.add_argument('--period', default='1y', help="History to fetch via DataLoader (default: 1y)")
+    parser.add_argument('--data', help="CSV of price data (Date index, Close, Volatility) instead of fetching")
+    parser.add_argument('--workers', type=int, default=None, help="Process pool size (default: all cores)")
+    parser.add_argument('--output', default='data/sweep_results.csv', help="Where to write the results table")
+    parser.add_argument('--train', type=int, default=None, metavar='BARS',
+                        help="Walk-forward: train window length in bars (enables walk-forward mode)")
+    parser.add_argument('--test', type=int, default=21, metavar='BARS',
+                        help="Walk-forward: test window length in bars (default: 21)")
+    parser.add_argument('--anchored', action='store_true',
+                        help="Walk-forward: grow train windows from the first bar instead of rolling them")
+    parser.add_argument('--objective', default='ROI', help="Walk-forward: sweep column to maximize (default: ROI)")
+    return parser
+
+
+def main(args):
+    if args.data:
+        price_data = pd.read_csv(args.data, index_col=0, parse_dates=True)
+    else:
+        from src.data_loader import DataLoader
+        price_data = DataLoader().fetch_underlying_data(period=args.period)
+
+    param_grid = dict(_parse_grid_arg(g) for g in args.grid)
+    configs = expand_grid(param_grid) if param_grid else [{}]
+
+    if args.train:
+        mode = 'anchored' if args.anchored else 'rolling'
+        print(f"Walk-forward ({mode}, train {args.train} / test {args.test} bars) over "
+              f"{len(configs)} configurations and {len(price_data)} bars...")
+        start = time.perf_counter()
+        result = run_walk_forward(price_data, configs, args.train, args.test, anchored=args.anchored,
+                                  objective=args.objective, max_workers=args.workers)
+        print(f"Walk-forward finished in {time.perf_counter() - start:.2f}s")
+
+        result['Windows'].to_csv(args.output, index=False)
+        equity_path = os.path.splitext(args.output)[0] + '_equity.csv'
+        result['Equity'].to_csv(equity_path, index=False)
+        print(result['Windows'].to_string(index=False))
+        summary = result['Summary']
+        print(f"Out-of-sample ROI: {summary['ROI']:.2f}% | Max Drawdown: {summary['Max_Drawdown']:.2f}%")
+        print(f"Windows saved to {args.output}, stitched equity to {equity_path}")
+        return
+    print(f"Sweeping {len(configs)} configurations over {len(price_data)} bars...")
+
+    start = time.perf_counter()
+    results = run_sweep(price_data, configs, max_workers=args.workers)
+    print(f"Sweep finished in {time.perf_counter() - start:.2f}s")
+
+    results.to_csv(args.output, index=False)
+    print(results.sort_values('ROI', ascending=False).head(10).to_string(index=False))
+    print(f"Results saved to {args.output}")
+
+
+def check_shared_views(n_bars=1000):
+    """
+    Smoke check: an attached frame, and the walk-forward window slices the
+    backtester reads from it, are views of the shared block.
+    """
+    index = pd.bdate_range('2020-01-01', periods=n_bars)
+    price_data = pd.DataFrame({'Close': np.linspace(20000, 24000, n_bars), 'Volatility': 0.15}, index=index)
+    shared = SharedPriceSeries(price_data)
+    try:
+        shm, frame = _attach(shared.handle())
+        values, _ = _layout(shm, shared.length)  # The mapping the frame was built on
+        window = frame.iloc[n_bars // 4:n_bars // 2]
+        for column in ('Close', 'Volatility'):
+            assert np.shares_memory(frame[column].to_numpy(), values), f"attached {column} is a copy"
+            assert np.shares_memory(_column_values(window, column), values), f"window {column} is a copy"
+        assert frame.equals(price_data), "attached frame differs from the published prices"
+        del frame, window, values
+        shm.close()
+    finally:
+        shared.close()
+    print(f"Shared price views OK: {n_bars} bars attached without copies")
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    parser.add_argument('--check', action='store_true', help="Run the shared-memory smoke check and exit")
+    args = parser.parse_args()
+    if args.check:
+        check_shared_views()
+    else:
+        main(args)
@@ -1,8 +1,17 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-def plot_dashboard(csv_path="data/option_chain_output.csv"):
+def plot_dashboard(csv_path="data/option_chain_output.csv", output_path=None, show=True):
+    """
+    Option analytics charts from the saved chain. matplotlib/seaborn load on
+    first call; with show=False the Agg backend is used, so it runs headless
+    and only writes output_path.
+    """
+    import matplotlib
+    if not show:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     # 1. Load Data
     df = pd.read_csv(csv_path)
     
@@ -35,9 +44,14 @@ def plot_dashboard(csv_path="data/option_chain_output.csv"):
     ax3.grid(True, alpha=0.3)
     ax3.legend()
 
-    # 3. Show Plot
+    # 3. Save / Show Plot
     plt.tight_layout()
-    plt.show()
+    if output_path:
+        fig.savefig(output_path, dpi=120)
+        print(f"Dashboard saved to {output_path}")
+    if show:
+        plt.show()
+    plt.close(fig)
 
 if __name__ == "__main__":
-    plot_dashboard()
\ No newline at end of file
+    plot_dashboard()
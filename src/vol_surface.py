@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+
+from src.pricing_engine import price_batch
+
+# DataFrame column aliases accepted by from_chain (first match wins)
+_IV_COLUMNS = ('IV', 'Implied_Vol')
+MIN_IV = 0.001  # Quotes at or below this (unsolved IVs) are left out, as in fit_iv_smile
+
+
+class VolSurface:
+    """
+    Implied volatility surface on a strike x expiry grid.
+
+    Each expiry slice keeps its strikes sorted with precomputed linear
+    coefficients (IV and slope per strike segment, flat beyond the wings).
+    Between expiries, total variance (IV^2 * T) is interpolated linearly in T;
+    outside the quoted expiries the nearest slice's IV is used.
+
+    All slices are packed into flat arrays keyed by slice number + strike, so
+    a batch of (K, T) queries costs two binary searches per query and no
+    Python loop. update_slice() replaces one expiry and only recomputes that
+    slice's coefficients; the flat arrays are repacked lazily on the next query.
+    Expiries are in years from the surface's snapshot (sticky tenor).
+    """
+    def __init__(self):
+        self._slices = {}    # Expiry (years) -> (strikes, ivs, slopes)
+        self._packed = None
+
+    def __len__(self):
+        return len(self._slices)
+
+    # --- BUILD ---
+
+    @classmethod
+    def from_chain(cls, chain, expiry=None):
+        """
+        Builds from a solved chain DataFrame: Strike, IV (or Implied_Vol) and
+        the expiry as 'T' (years), 'Expiry_Days' or the `expiry` argument (years).
+        Call and put quotes at the same strike are averaged.
+        """
+        iv_column = next((c for c in _IV_COLUMNS if c in chain), None)
+        if iv_column is None:
+            raise ValueError("Chain needs an 'IV' or 'Implied_Vol' column")
+        if 'T' in chain:
+            tenors = chain['T'].to_numpy(dtype=float)
+        elif 'Expiry_Days' in chain:
+            tenors = chain['Expiry_Days'].to_numpy(dtype=float) / 365
+        elif expiry is not None:
+            tenors = np.full(len(chain), float(expiry))
+        else:
+            raise ValueError("Chain needs a 'T'/'Expiry_Days' column or an expiry argument")
+
+        quotes = pd.DataFrame({'T': tenors, 'Strike': chain['Strike'].to_numpy(dtype=float),
+                               'IV': chain[iv_column].to_numpy(dtype=float)})
+        return cls._from_quotes(quotes)
+
+    @classmethod
+    def from_chain_store(cls, store, date, timestamp=None):
+        """
+        Builds from every expiry stored for `date` in an OptionChainStore, using
+        the latest snapshot (or the one at `timestamp`).
+        """
+        parts = [part for _, part in store.scan(date, date)]
+        records = np.concatenate(parts) if parts else []
+        if len(records) == 0:
+            return cls()
+        stamp = records['Timestamp'].max() if timestamp is None else pd.Timestamp(timestamp).as_unit('ns').value
+        records = records[records['Timestamp'] == stamp]
+        today = stamp / (86400 * 10**9)
+        quotes = pd.DataFrame({'T': (records['Expiry'] - np.floor(today)) / 365,
+                               'Strike': records['Strike'], 'IV': records['IV']})
+        return cls._from_quotes(quotes)
+
+    @classmethod
+    def _from_quotes(cls, quotes):
+        surface = cls()
+        quotes = quotes[(quotes['IV'] > MIN_IV) & (quotes['T'] > 0)]
+        for tenor, smile in quotes.groupby('T'):
+            smile = smile.groupby('Strike')['IV'].mean()
+            surface.update_slice(tenor, smile.index.to_numpy(), smile.to_numpy())
+        return surface
+
+    def update_slice(self, expiry, strikes, ivs):
+        """
+        Inserts or replaces the smile of one expiry (years). Invalid IVs are
+        dropped; a slice left empty is removed.
+        """
+        strikes = np.asarray(strikes, dtype=float)
+        ivs = np.asarray(ivs, dtype=float)
+        valid = ivs > MIN_IV
+        strikes, ivs = strikes[valid], ivs[valid]
+        expiry = float(expiry)
+        self._packed = None
+        if len(strikes) == 0:
+            self._slices.pop(expiry, None)
+            return
+
+        order = np.argsort(strikes, kind='stable')
+        strikes, ivs = strikes[order], ivs[order]
+        slopes = np.zeros(len(strikes))  # Last strike's slope stays 0 (flat wing)
+        slopes[:-1] = np.diff(ivs) / np.maximum(np.diff(strikes), 1e-12)
+        self._slices[expiry] = (strikes, ivs, slopes)
+
+    def remove_slice(self, expiry):
+        if self._slices.pop(float(expiry), None) is not None:
+            self._packed = None
+
+    def _pack(self):
+        # Flat sorted key: slice number * span + (strike - min strike), so one
+        # searchsorted finds the segment inside any slice
+        expiries = np.array(sorted(self._slices))
+        slices = [self._slices[e] for e in expiries]
+        sizes = np.array([len(s[0]) for s in slices])
+        strikes = np.concatenate([s[0] for s in slices])
+        low = strikes.min()
+        span = strikes.max() - low + 1.0
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+        slice_ids = np.repeat(np.arange(len(slices)), sizes)
+        self._packed = {
+            'Expiry': expiries,
+            'Key': slice_ids * span + (strikes - low),
+            'Strike': strikes,
+            'IV': np.concatenate([s[1] for s in slices]),
+            'Slope': np.concatenate([s[2] for s in slices]),
+            'First': offsets[:-1],
+            'Last': offsets[1:] - 1,
+            'Low': low,
+            'Span': span
+        }
+        return self._packed
+
+    # --- QUERIES ---
+
+    def _slice_vol(self, slice_ids, strike):
+        p = self._packed
+        first, last = p['First'][slice_ids], p['Last'][slice_ids]
+        strike = np.clip(strike, p['Strike'][first], p['Strike'][last])  # Flat wings
+        key = slice_ids * p['Span'] + (strike - p['Low'])
+        j = np.clip(np.searchsorted(p['Key'], key, side='right') - 1, first, last)
+        return p['IV'][j] + p['Slope'][j] * (strike - p['Strike'][j])
+
+    def vol(self, strike, T):
+        """
+        IVs for broadcast arrays of strikes and times to expiry (years).
+        """
+        if not self._slices:
+            raise ValueError("VolSurface has no slices")
+        p = self._packed or self._pack()
+        strike, T = np.broadcast_arrays(np.asarray(strike, dtype=float), np.asarray(T, dtype=float))
+        shape = strike.shape
+        strike, T = strike.ravel(), T.ravel()
+
+        expiries = p['Expiry']
+        n = len(expiries)
+        upper = np.clip(np.searchsorted(expiries, T), 0, n - 1)
+        lower = np.clip(upper - 1, 0, n - 1)
+        vol_lower = self._slice_vol(lower, strike)
+        vol_upper = self._slice_vol(upper, strike)
+
+        # Linear in total variance between the bracketing expiries
+        t_lower, t_upper = expiries[lower], expiries[upper]
+        inside = (T > t_lower) & (T < t_upper)
+        weight = np.where(inside, (T - t_lower) / np.where(inside, t_upper - t_lower, 1.0), 0.0)
+        variance = (1 - weight) * vol_lower ** 2 * t_lower + weight * vol_upper ** 2 * t_upper
+        interpolated = np.sqrt(variance / np.where(inside, T, 1.0))
+
+        # Before the first / after the last expiry `upper` is that slice itself
+        return np.where(inside, interpolated, vol_upper).reshape(shape)
+
+    def book_vols(self, book, now, vol_shift=0.0):
+        """
+        Per-leg IVs for a PositionBook at `now` (days since epoch).
+        """
+        return self.vol(book.Strike, book.time_to_expiry(now)) + vol_shift
+
+    def price_book(self, book, spot, now, vol_shift=0.0):
+        """
+        Per-leg model prices of a PositionBook off the surface. `spot` may be
+        an array of scenarios (shape (n, 1)) to price every leg under each.
+        """
+        return price_batch(spot, book.Strike, book.time_to_expiry(now), book.r,
+                           self.book_vols(book, now, vol_shift), book.Is_Call)
+
+    def to_frame(self):
+        rows = [pd.DataFrame({'T': expiry, 'Strike': strikes, 'IV': ivs})
+                for expiry, (strikes, ivs, _) in sorted(self._slices.items())]
+        return pd.concat(rows, ignore_index=True) if rows else pd.DataFrame(columns=['T', 'Strike', 'IV'])